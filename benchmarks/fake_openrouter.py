@@ -0,0 +1,281 @@
+"""
+Local OpenAI-compatible stand-in for OpenRouter.
+
+Replays the completions recorded in benchmarks/recordings/ for the bundled
+input scripts, so the pipeline can be exercised without network access or
+API cost. Latency, transient errors and 429s are injected on request.
+
+    python benchmarks/fake_openrouter.py [--port 8765] [--latency 0.5] [--tokens-per-second 150]
+                                         [--error-rate 0.05] [--rate-limit-rate 0.05] [--retry-after 1]
+
+then point the CLI at it:
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 OPENROUTER_API_KEY=fake python src/main.py input/block.md
+
+Requests are recognised by their system prompt: generation requests get the
+recorded code for the scene named in the prompt, critic requests always
+pass, repair requests get the broken code back unchanged (or, for the
+edit/diff repair formats, a patch that only tags its first line).
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDINGS_DIR = os.path.join(ROOT, "benchmarks", "recordings")
+
+# Served for scenes without a recording
+FALLBACK_CODE = """title = Text("Placeholder", font_size=48)
+self.play(Write(title))
+self.wait(3)"""
+
+def load_recordings(directory=RECORDINGS_DIR):
+    """Returns {scene_name: code} from every recording file in directory."""
+    scenes = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for name, entry in json.load(f)["scenes"].items():
+                scenes[name] = entry["code"]
+    return scenes
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+class FakeOpenRouter:
+    """
+    The fake server. start() runs it on a background thread and returns its base URL.
+
+    Args:
+        latency (float): Seconds before the first byte of every response.
+        tokens_per_second (float): Generation speed; completions take
+            latency + tokens / tokens_per_second (0 = instant).
+        error_rate (float): Fraction of requests answered with a 500.
+        rate_limit_rate (float): Fraction of requests answered with a 429.
+        retry_after (float): Retry-After sent with 429s, in seconds.
+        seed (int): Seed for the error/429 draws, for repeatable runs.
+    """
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, seed=0, recordings=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.recordings = load_recordings() if recordings is None else recordings
+        self.stats = {'requests': 0, 'completions': 0, 'errors': 0, 'rate_limited': 0, 'unrecorded': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # -- responses ---------------------------------------------------------
+
+    def respond(self, body):
+        """Builds the completion text for a chat request body."""
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+
+        if "Code Critic" in system:
+            scenes = re.findall(r"### SCENE (\d+)", user)
+            if scenes:
+                return json.dumps({"results": [{"index": int(i), "passed": True, "feedback": ""} for i in scenes]})
+            return json.dumps({"passed": True, "feedback": ""})
+
+        if "Code Repairer" in system and "line numbers are not part of the code" in user:
+            # Patch formats: a one-line edit that only tags the first line
+            match = re.search(r"^\s*1\| (.*)$", user, re.MULTILINE)
+            first = match.group(1) if match else "self.wait(1)"
+            if "REPLACE <first>-<last>" in system:
+                return f"REPLACE 1-1\n{first}  # repaired\nEND"
+            return f"@@ -1,1 +1,1 @@\n-{first}\n+{first}  # repaired"
+
+        if "Code Repairer" in system:
+            match = re.search(r"### BROKEN CODE:\n(.*?)\n\s*### ERROR MESSAGE:", user, re.DOTALL)
+            return match.group(1).strip() if match else FALLBACK_CODE
+
+        match = re.search(r"Scene Name: (.+)", user)
+        name = match.group(1).strip() if match else None
+        if name in self.recordings:
+            return self.recordings[name]
+        with self._lock:
+            self.stats['unrecorded'] += 1
+        return FALLBACK_CODE
+
+    def draw_failure(self):
+        """Returns (status, headers) for an injected failure, or None."""
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 429, {"Retry-After": f"{self.retry_after:g}"}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return 500, {}
+            self.stats['completions'] += 1
+            return None
+
+    def generation_time(self, content):
+        if not self.tokens_per_second:
+            return 0.0
+        return _tokens(content) / self.tokens_per_second
+
+    # -- server ------------------------------------------------------------
+
+    def start(self, host="127.0.0.1", port=0):
+        """Starts serving in the background. Returns the base URL (…/v1)."""
+        fake = self
+
+        class Handler(_Handler):
+            server_state = fake
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openrouter", daemon=True)
+        self._thread.start()
+        return f"http://{host}:{self._server.server_address[1]}/v1"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class _Handler(BaseHTTPRequestHandler):
+    server_state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        fake = self.server_state
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        time.sleep(fake.latency)
+        failure = fake.draw_failure()
+        if failure:
+            status, headers = failure
+            message = "Rate limit exceeded" if status == 429 else "Injected upstream error"
+            self._send_json(status, {"error": {"message": message, "code": status}}, headers)
+            return
+
+        content = fake.respond(body)
+        prompt_tokens = sum(_tokens(m.get("content", "")) for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _tokens(content),
+            "total_tokens": prompt_tokens + _tokens(content),
+            "cost": 0.0,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake")
+
+        if body.get("stream"):
+            self._stream(completion_id, model, content, usage, fake.generation_time(content))
+            return
+
+        time.sleep(fake.generation_time(content))
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id, model, content, usage, duration):
+        """Sends content as server-sent events, paced over duration seconds."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        pieces = re.findall(r".{1,16}", content, re.DOTALL) or [""]
+        delay = duration / len(pieces)
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        try:
+            for piece in pieces:
+                chunk = dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if delay:
+                    time.sleep(delay)
+            final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode())
+            self.wfile.write(f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client cancelled the stream early
+
+def add_server_arguments(parser):
+    """Adds the fake server's latency / failure options to an argparse parser."""
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Seconds before every response starts (default: 0.5)")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0,
+                        help="Completion generation speed, 0 for instant (default: 150)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests failing with a 500 (default: 0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of requests rejected with a 429 (default: 0)")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After seconds sent with 429s (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected failures (default: 0)")
+
+def server_from_args(args):
+    return FakeOpenRouter(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded completions on an OpenAI-compatible endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    fake = server_from_args(args)
+    base_url = fake.start(args.host, args.port)
+    print(f"Fake OpenRouter serving {len(fake.recordings)} recorded scenes at {base_url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+        print(f"Stopped. {fake.stats}")
+
+if __name__ == "__main__":
+    main()
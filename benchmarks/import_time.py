@@ -0,0 +1,78 @@
+"""
+Startup benchmark for the Manimator CLI.
+
+Runs the fast-path commands (--help, plan, a bad input path) in fresh
+interpreters and fails if any of them gets slower than the budget or
+imports one of the heavy modules that should only load for a real run.
+
+    python benchmarks/import_time.py [--budget-ms 300] [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "src", "main.py")
+
+# None of these may be imported before we know we are going to call the LLM or render
+HEAVY_MODULES = ["openai", "httpx", "rich", "manim", "numpy", "dotenv"]
+
+COMMANDS = {
+    "help": ["--help"],
+    "plan": ["plan", os.path.join(ROOT, "input", "example.md")],
+    "missing input": [os.path.join(ROOT, "input", "does-not-exist.md")],
+}
+
+def imported_modules(args):
+    """Returns the top-level modules imported while running main.py with args."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN, *args],
+        capture_output=True, text=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+    return modules
+
+def best_wall_time(cmd, repeat):
+    """Best-of-N wall time (seconds) of running cmd in a fresh process."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Catch CLI startup regressions")
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="Maximum wall time per command in milliseconds (default: 300)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per command; the best one counts (default: 5)")
+    args = parser.parse_args()
+
+    # Interpreter startup alone, for reference
+    baseline = best_wall_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'python -c pass':<16} {baseline * 1000:7.1f} ms")
+
+    failed = False
+    for label, command in COMMANDS.items():
+        elapsed = best_wall_time([sys.executable, MAIN, *command], args.repeat)
+        heavy = sorted(set(HEAVY_MODULES) & imported_modules(command))
+        status = "ok"
+        if elapsed * 1000 > args.budget_ms:
+            status = f"SLOW (budget {args.budget_ms:.0f} ms)"
+            failed = True
+        if heavy:
+            status = f"HEAVY IMPORTS: {', '.join(heavy)}"
+            failed = True
+        print(f"{label:<16} {elapsed * 1000:7.1f} ms  {status}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Pipeline throughput benchmark, fully offline.
+
+Starts the fake OpenRouter server (benchmarks/fake_openrouter.py), points the
+pipeline at it and processes the bundled input scripts once per concurrency
+level. Rendering is stubbed by default (a sleep of --render-time seconds per
+final render, --validate-time per validation run, bounded by the renderer's
+render slots like real manim processes); pass --render real to run manim.
+Caches are disabled so every run does the same work.
+
+    python benchmarks/pipeline_throughput.py [--jobs 1,2,4,8] [--latency 0.5] [--stream]
+                                             [--rate-limit-rate 0.05] [--render stub|real]
+
+Reports scenes per minute, p50/p95 scene latency and speedup over the first
+concurrency level. The final ffmpeg merge is not part of the measurement.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openrouter import add_server_arguments, server_from_args
+
+DEFAULT_INPUTS = ["input/block.md", "input/crypto.md", "input/example.md"]
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def stub_renderer(renderer, render_time, validate_time):
+    """Replaces manim with a sleep that holds a render slot, like a real render would."""
+    def render_attempt(full_script, workdir, output_filename, quality, validate=None, sections=False, record=False):
+        start = time.perf_counter()
+        with renderer._render_slots:
+            time.sleep(validate_time if validate else render_time)
+        path = None
+        if not validate:
+            path = os.path.join(workdir, output_filename)
+            with open(path, "wb") as f:
+                f.write(b"stub")
+        return {'ok': True, 'path': path, 'duration': time.perf_counter() - start, 'cpu_time': 0.0, 'error': None}
+
+    renderer._render_attempt = render_attempt
+
+def run_level(jobs, documents, pipeline, renderer):
+    """Processes every document at one concurrency level. Returns (wall seconds, scene latencies)."""
+    latencies = []
+    process_scene = pipeline.process_scene
+
+    def timed(scene):
+        start = time.perf_counter()
+        try:
+            return process_scene(scene)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    renderer.set_max_renders(min(jobs, os.cpu_count() or 1))
+    pipeline.process_scene = timed
+    start = time.perf_counter()
+    try:
+        for scenes in documents:
+            pipeline.run_pipeline(scenes, jobs=jobs)
+    finally:
+        pipeline.process_scene = process_scene
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", default="1,2,4,8",
+                        help="Comma-separated concurrency levels to measure (default: 1,2,4,8)")
+    parser.add_argument("--inputs", nargs="+", default=DEFAULT_INPUTS,
+                        help="Input scripts, relative to the repo root (default: the three bundled ones)")
+    parser.add_argument("--render", choices=["stub", "real"], default="stub",
+                        help="Stub out manim (default) or render for real")
+    parser.add_argument("--render-time", type=float, default=2.0,
+                        help="Seconds per stubbed final render (default: 2.0)")
+    parser.add_argument("--validate-time", type=float, default=0.3,
+                        help="Seconds per stubbed validation run (default: 0.3)")
+    parser.add_argument("--stream", action="store_true", help="Use streamed code completions")
+    parser.add_argument("--candidates", type=int, default=1, help="Speculative candidates per scene (default: 1)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.jobs.split(",")]
+
+    fake = server_from_args(args)
+    base_url = fake.start()
+    workdir = tempfile.mkdtemp(prefix="manimator-bench-")
+    # Must be set before the pipeline modules read them
+    os.environ.update({
+        "OPENROUTER_BASE_URL": base_url,
+        "OPENROUTER_API_KEY": "benchmark",
+        "MANIMATOR_CACHE_DIR": os.path.join(workdir, "cache"),
+        "MANIMATOR_NO_CACHE": "1",
+    })
+
+    import llm
+    import pipeline
+    import renderer
+    import speculation
+    import render_worker
+    from parser import parse_markdown
+
+    # Keep the per-scene console output out of the report
+    pipeline.console.quiet = True
+    renderer.console.quiet = True
+    if args.stream:
+        llm.set_streaming(True)
+    speculation.configure(candidates=args.candidates)
+    if args.render == "stub":
+        stub_renderer(renderer, args.render_time, args.validate_time)
+
+    documents = [parse_markdown(os.path.join(ROOT, path)) for path in args.inputs]
+    # Rendered scenes land in ./output: keep them out of the repo
+    os.chdir(workdir)
+    total_scenes = sum(len(scenes) for scenes in documents)
+    print(f"{total_scenes} scenes from {len(documents)} scripts; fake API at {base_url} "
+          f"(latency {args.latency}s, {args.tokens_per_second:g} tok/s, "
+          f"{args.error_rate:.0%} errors, {args.rate_limit_rate:.0%} 429s); render: {args.render}")
+    print()
+    print(f"{'jobs':>4}  {'wall (s)':>8}  {'scenes/min':>10}  {'p50 (s)':>7}  {'p95 (s)':>7}  "
+          f"{'speedup':>7}  {'requests':>8}  {'429s':>4}  {'500s':>4}")
+
+    baseline = None
+    try:
+        for jobs in levels:
+            before = dict(fake.stats)
+            wall, latencies = run_level(jobs, documents, pipeline, renderer)
+            requests = fake.stats['requests'] - before['requests']
+            rate_limited = fake.stats['rate_limited'] - before['rate_limited']
+            errors = fake.stats['errors'] - before['errors']
+            throughput = total_scenes / wall * 60
+            baseline = baseline or throughput
+            print(f"{jobs:>4}  {wall:>8.1f}  {throughput:>10.1f}  {percentile(latencies, 0.5):>7.2f}  "
+                  f"{percentile(latencies, 0.95):>7.2f}  {throughput / baseline:>6.2f}x  "
+                  f"{requests:>8}  {rate_limited:>4}  {errors:>4}")
+    finally:
+        render_worker.shutdown()
+        fake.stop()
+
+    if fake.stats['unrecorded']:
+        print(f"\nWarning: {fake.stats['unrecorded']} generation requests had no recording (placeholder code served).")
+
+if __name__ == "__main__":
+    main()
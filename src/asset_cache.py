@@ -0,0 +1,190 @@
+import os
+import shutil
+import threading
+
+from cache import CACHE_ROOT, cache_enabled
+
+# Compiled Tex/MathTex (LaTeX -> dvisvgm) and Text (Pango) SVGs, shared by every render.
+# Manim names these files by a hash of their content, so one flat directory per kind
+# is already content-addressed: <ASSET_CACHE_DIR>/Tex/<hash>.svg, .../texts/<hash>.svg
+ASSET_CACHE_DIR = os.path.join(CACHE_ROOT, "assets")
+KINDS = ("Tex", "texts")
+
+# Default budget for garbage collection. Override with MANIMATOR_ASSET_CACHE_MB.
+MAX_BYTES = int(os.getenv("MANIMATOR_ASSET_CACHE_MB", "256")) * 1024 * 1024
+
+_lock = threading.Lock()
+
+def _kind_dir(kind):
+    return os.path.join(ASSET_CACHE_DIR, kind)
+
+def _link(source, target):
+    """Hard-links source to target, or symlinks it when they are on different filesystems (tmpfs)."""
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(os.path.abspath(source), target)
+
+def lookup_dir():
+    """Absolute path of the shared cache for warm workers' on-demand lookup, or None when caching is off."""
+    return os.path.abspath(ASSET_CACHE_DIR) if cache_enabled() else None
+
+def fetch(kind, directory, name, cache_dir):
+    """
+    Links one cached asset, <name>.svg, into a job's asset dir if the cache has it.
+
+    Used by warm workers the moment manim names a Tex/Text file (by content
+    hash), so a job only touches the assets it actually uses.
+
+    Args:
+        kind (str): One of KINDS.
+        directory (str): The job's tex_dir or text_dir.
+        name (str): Asset hash, without extension.
+        cache_dir (str): The shared cache (see lookup_dir).
+
+    Returns:
+        bool: Whether the asset is now present in directory.
+    """
+    target = os.path.join(directory, name + ".svg")
+    if os.path.exists(target):
+        return True
+    source = os.path.join(cache_dir, kind, name + ".svg")
+    if not os.path.exists(source):
+        return False  # not cached: manim compiles it
+    try:
+        _link(source, target)
+        return True
+    except OSError:
+        return False  # evicted meanwhile
+
+def seed(asset_dirs, sources=None):
+    """
+    Links every cached SVG into a job's private tex_dir/text_dir.
+
+    Manim checks for <hash>.svg before compiling anything, so seeded assets
+    are never rebuilt. This costs a link per cached asset: warm workers use
+    fetch() instead, and this is left for manim CLI renders. Each job writes new assets into its own directories
+    only, so concurrent jobs compiling the same formula never share a half
+    written .tex/.dvi/.svg file.
+
+    Args:
+        asset_dirs (dict): {kind: directory} for each of KINDS.
+        sources (dict): {kind: directory} to link from instead of the shared
+            cache, e.g. another job's asset dirs (used even when caching is off).
+
+    Returns:
+        int: Number of assets linked.
+    """
+    linked = 0
+    for kind, directory in asset_dirs.items():
+        os.makedirs(directory, exist_ok=True)
+        if sources is None and not cache_enabled():
+            continue
+        source_dir = sources[kind] if sources is not None else _kind_dir(kind)
+        try:
+            filenames = os.listdir(source_dir)
+        except OSError:
+            continue
+        for filename in filenames:
+            if not filename.endswith(".svg"):
+                continue
+            try:
+                _link(os.path.join(source_dir, filename), os.path.join(directory, filename))
+                linked += 1
+            except OSError:
+                pass  # evicted meanwhile, or already present
+    return linked
+
+def publish(asset_dirs):
+    """
+    Adds the SVGs a job compiled to the shared cache.
+
+    Each file is copied to a temp name inside the cache and renamed into
+    place with os.replace, so readers only ever see complete files. Assets
+    that are already cached (seeded links included) are skipped.
+
+    Args:
+        asset_dirs (dict): {kind: directory} for each of KINDS.
+
+    Returns:
+        int: Number of new assets published.
+    """
+    if not cache_enabled():
+        return 0
+    published = 0
+    for kind, directory in asset_dirs.items():
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            continue
+        os.makedirs(_kind_dir(kind), exist_ok=True)
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            cached_path = os.path.join(_kind_dir(kind), filename)
+            if not filename.endswith(".svg") or os.path.islink(path) or os.path.exists(cached_path):
+                continue
+            tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, cached_path)
+                published += 1
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    return published
+
+def gc(max_bytes=MAX_BYTES):
+    """
+    Evicts the oldest assets until the cache fits in max_bytes.
+
+    Also removes temp files left behind by interrupted publishes. Jobs that
+    seeded an evicted asset keep working: hard links keep the data alive,
+    and a dangling symlink just makes manim compile the asset again.
+
+    Returns:
+        int: Number of files removed.
+    """
+    removed = 0
+    with _lock:
+        files = []
+        for kind in KINDS:
+            directory = _kind_dir(kind)
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if filename.endswith(".tmp"):
+                    os.remove(path)
+                    removed += 1
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+    return removed
+
+def clear():
+    """Invalidates the whole asset cache."""
+    with _lock:
+        shutil.rmtree(ASSET_CACHE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    # Simple maintenance entry point: python asset_cache.py [gc|clear]
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "gc"
+    if command == "clear":
+        clear()
+    else:
+        print(f"Removed {gc()} files.")
@@ -0,0 +1,257 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rich.console import Console
+
+from parser import parse_markdown
+from pipeline import generate_stage, check_stage, render_stage, merge_videos
+from watch import scene_fingerprint
+import tracing
+
+console = Console()
+
+# Per-scene stages, in order; each is checkpointed when it finishes
+STAGES = ["generate", "check", "render"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    output TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | done | failed
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    scene_index INTEGER NOT NULL,
+    scene_name TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    stage TEXT NOT NULL,                      -- generate | check | render
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | running | done | failed
+    result TEXT,                              -- JSON output of the stage
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL,
+    UNIQUE (document_id, scene_index, stage)
+);
+"""
+
+class JobStore:
+    """
+    SQLite job table: one row per (document, scene, stage).
+
+    Every state change is committed immediately, so after a crash the
+    table says exactly which stages finished (and with what output).
+    Rows left 'running' by a crash are simply run again.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by the scene threads, serialised by _lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def reset(self):
+        """Forgets all documents and jobs (a fresh, non-resumed batch)."""
+        with self._lock:
+            self._db.executescript("DELETE FROM jobs; DELETE FROM documents;")
+
+    def add_document(self, path, scenes):
+        """
+        Registers a document and its scene jobs. Returns the document id.
+
+        Jobs of scenes that are unchanged since the last run are kept;
+        a scene whose content changed starts over from its first stage.
+        """
+        path = os.path.abspath(path)
+        now = time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            db.execute("INSERT OR IGNORE INTO documents (path, updated) VALUES (?, ?)", (path, now))
+            doc_id = db.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()[0]
+            for index, scene in enumerate(scenes):
+                fingerprint = scene_fingerprint(scene)
+                db.execute("DELETE FROM jobs WHERE document_id = ? AND scene_index = ? AND fingerprint != ?",
+                           (doc_id, index, fingerprint))
+                for stage in STAGES:
+                    db.execute("INSERT OR IGNORE INTO jobs (document_id, scene_index, scene_name, fingerprint, "
+                               "stage, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                               (doc_id, index, scene['scene_name'], fingerprint, stage, now))
+            db.execute("DELETE FROM jobs WHERE document_id = ? AND scene_index >= ?", (doc_id, len(scenes)))
+            db.execute("COMMIT")
+        return doc_id
+
+    def document(self, doc_id):
+        """Returns (status, output) of a document."""
+        return self._execute("SELECT status, output FROM documents WHERE id = ?", (doc_id,))[0]
+
+    def result(self, doc_id, index, stage):
+        """The checkpointed output of a finished stage, or None."""
+        rows = self._execute("SELECT result FROM jobs WHERE document_id = ? AND scene_index = ? AND stage = ? "
+                             "AND status = 'done'", (doc_id, index, stage))
+        return json.loads(rows[0][0]) if rows else None
+
+    def _set(self, doc_id, index, stage, status, result=None, error=None, attempt=0):
+        self._execute("UPDATE jobs SET status = ?, result = ?, error = ?, attempts = attempts + ?, updated = ? "
+                      "WHERE document_id = ? AND scene_index = ? AND stage = ?",
+                      (status, result, error, attempt, time.time(), doc_id, index, stage))
+
+    def start(self, doc_id, index, stage):
+        self._set(doc_id, index, stage, "running", attempt=1)
+
+    def finish(self, doc_id, index, stage, result):
+        self._set(doc_id, index, stage, "done", result=json.dumps(result))
+
+    def fail(self, doc_id, index, stage, error):
+        self._set(doc_id, index, stage, "failed", error=error)
+
+    def finish_document(self, doc_id, status, output):
+        self._execute("UPDATE documents SET status = ?, output = ?, updated = ? WHERE id = ?",
+                      (status, output, time.time(), doc_id))
+
+    def summary(self):
+        """Job counts as {stage: {status: n}}."""
+        counts = {}
+        for stage, status, n in self._execute("SELECT stage, status, COUNT(*) FROM jobs GROUP BY stage, status"):
+            counts.setdefault(stage, {})[status] = n
+        return counts
+
+def find_documents(paths):
+    """Expands directories to the markdown files they contain (sorted)."""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            documents.extend(sorted(glob.glob(os.path.join(path, "*.md"))))
+        else:
+            documents.append(path)
+    return documents
+
+def _stage(store, doc_id, index, stage, run):
+    """Returns a stage's checkpointed output, or runs it and checkpoints the result."""
+    result = store.result(doc_id, index, stage)
+    if result is not None:
+        return result
+    store.start(doc_id, index, stage)
+    try:
+        result = run()
+    except Exception as e:
+        store.fail(doc_id, index, stage, f"{type(e).__name__}: {e}")
+        raise
+    store.finish(doc_id, index, stage, result)
+    return result
+
+def _process(store, doc_id, index, scene, media_dir):
+    """Runs the remaining stages of one scene. Returns the video path or None."""
+    def generate():
+        code, verdict = generate_stage(scene)
+        return {'code': code, 'verdict': verdict}
+
+    def render(code):
+        path = render_stage(scene, code, output_dir=media_dir)
+        if path is None:
+            raise RuntimeError("render failed")
+        return path
+
+    try:
+        generated = _stage(store, doc_id, index, "generate", generate)
+        code = _stage(store, doc_id, index, "check",
+                      lambda: check_stage(scene, generated['code'], generated['verdict']))
+        path = store.result(doc_id, index, "render")
+        if path is not None and not os.path.exists(path):
+            # The checkpointed video is gone: render again
+            store.fail(doc_id, index, "render", "video missing")
+        return _stage(store, doc_id, index, "render", lambda: render(code))
+    except Exception as e:
+        console.print(f"[bold red]Failed to process scene {scene['scene_name']}: {e}[/bold red]")
+        return None
+
+def run_batch(paths, store, jobs=1, output_dir="output/batch"):
+    """
+    Processes several documents through one shared scene pool.
+
+    Scenes of all documents share the pool (and the global render slots and
+    LLM rate limits), so a short document never leaves workers idle. Each
+    document is merged as soon as its last scene finishes.
+
+    Args:
+        paths (list): Markdown files to process.
+        store (JobStore): Job table; finished stages found there are skipped.
+        jobs (int): Number of scenes processed concurrently across all documents.
+        output_dir (str): Where merged videos (<document>.mp4) and media go.
+
+    Returns:
+        dict: {path: merged video path or None}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    documents = {}
+    for path in paths:
+        with tracing.span("parse", document=path):
+            scenes = parse_markdown(path)
+        doc_id = store.add_document(path, scenes)
+        status, output = store.document(doc_id)
+        if status == "done" and output and os.path.exists(output) and all(
+                store.result(doc_id, i, "render") for i in range(len(scenes))):
+            console.print(f"[dim]{path}: already done ({output}).[/dim]")
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        documents[doc_id] = {
+            'path': path,
+            'scenes': scenes,
+            'videos': [None] * len(scenes),
+            'remaining': len(scenes),
+            'output': os.path.join(output_dir, f"{stem}.mp4"),
+            # Per-document media dir: scene names may repeat across documents
+            'media': os.path.join(output_dir, stem),
+        }
+        console.print(f"[bold green]{path}: {len(scenes)} scenes queued.[/bold green]")
+
+    outputs = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {}
+        for doc_id, doc in documents.items():
+            if not doc['scenes']:
+                store.finish_document(doc_id, "failed", None)
+                outputs[doc['path']] = None
+            for index, scene in enumerate(doc['scenes']):
+                future = pool.submit(_process, store, doc_id, index, scene, doc['media'])
+                futures[future] = (doc_id, index)
+
+        for future in as_completed(futures):
+            doc_id, index = futures[future]
+            doc = documents[doc_id]
+            doc['videos'][index] = future.result()
+            doc['remaining'] -= 1
+            if doc['remaining']:
+                continue
+            outputs[doc['path']] = _merge_document(store, doc_id, doc)
+    return outputs
+
+def _merge_document(store, doc_id, doc):
+    videos = [path for path in doc['videos'] if path]
+    missing = len(doc['videos']) - len(videos)
+    if not videos:
+        console.print(f"[bold yellow]{doc['path']}: no videos were generated.[/bold yellow]")
+        store.finish_document(doc_id, "failed", None)
+        return None
+    output = merge_videos(videos, doc['output'])
+    if output is None:
+        console.print(f"[bold red]{doc['path']}: error merging videos![/bold red]")
+        store.finish_document(doc_id, "failed", None)
+        return None
+    note = f" ({missing} scenes missing, run again with --resume to retry them)" if missing else ""
+    console.print(f"[bold green]{doc['path']}: saved to {output}{note}[/bold green]")
+    # Incomplete documents stay pending so --resume retries their failed scenes
+    store.finish_document(doc_id, "pending" if missing else "done", output)
+    return output
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Root directory for all on-disk caches. Override with MANIMATOR_CACHE_DIR.
+CACHE_ROOT = os.getenv("MANIMATOR_CACHE_DIR", os.path.join(".cache", "manimator"))
+
+# Caching can be bypassed for a whole run (e.g. --no-cache or MANIMATOR_NO_CACHE=1)
+_enabled = not os.getenv("MANIMATOR_NO_CACHE")
+
+def set_enabled(enabled):
+    """Globally enables or bypasses every DiskCache (reads and writes)."""
+    global _enabled
+    _enabled = enabled
+
+def cache_enabled():
+    return _enabled
+
+def cache_key(*parts):
+    """
+    Builds a content-addressed key from arbitrary JSON-serialisable parts.
+    
+    Returns:
+        str: Hex SHA-256 digest of the canonical JSON encoding of parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    A small persistent key -> JSON value store with size-bounded LRU eviction.
+    
+    Each entry is one file under CACHE_ROOT/<name>/<key[:2]>/<key>.json. A hit
+    bumps the file's mtime, so eviction (oldest mtime first) approximates LRU.
+    Writes go through a temp file and os.replace, so concurrent writers never
+    leave a half-written entry behind.
+    
+    The directory is only scanned on the first write of a run and when the
+    running size estimate crosses max_bytes; eviction then frees down to
+    EVICT_TO of the budget, so the next scan is many writes away.
+    """
+
+    # Fraction of max_bytes an eviction frees down to
+    EVICT_TO = 0.9
+
+    def __init__(self, name, max_bytes):
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # estimated bytes on disk; None until the first scan
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        if not _enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        """Stores value under key, then evicts old entries if over budget."""
+        if not _enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is not None:
+                # Other processes' writes are not counted: the next run's scan catches up
+                self._size += size
+            needs_scan = self._size is None or self._size > self.max_bytes
+        if needs_scan:
+            self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits max_bytes (down to EVICT_TO of it)."""
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    if not filename.endswith(".json"):
+                        continue
+                    path = os.path.join(root, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+
+            target = self.max_bytes * self.EVICT_TO if total > self.max_bytes else self.max_bytes
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._size = total
+
+    def clear(self):
+        """Invalidates every entry in this cache."""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._size = 0
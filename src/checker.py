@@ -1,14 +1,21 @@
-import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import os
+import threading
+from concurrent.futures import Future
+
+from llm import default_model, chat_completion
+from local_checker import local_check
+import tracing
 
-load_dotenv()
+# Inconclusive scenes are batched into one critic request: up to this many
+# per request, waiting at most this long (seconds) for others to join.
+BATCH_SIZE = int(os.getenv("MANIMATOR_CHECK_BATCH", "8"))
+BATCH_WINDOW = float(os.getenv("MANIMATOR_CHECK_BATCH_WINDOW", "0.25"))
+# How many checks can be waiting at once (scenes x candidates); None if unknown
+_max_in_flight = None
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-)
+_stats_lock = threading.Lock()
+_stats = {'local_pass': 0, 'local_fail': 0, 'llm_scenes': 0, 'llm_requests': 0, 'unchecked': 0}
 
 CHECKER_SYSTEM_PROMPT = """You are a Manim Code Critic.
 Your job is to verify if the generated Manim code matches the user's visual instructions.
@@ -29,16 +36,13 @@ Instructions:
    }
 """
 
-def check_code(code, scene_data):
+def _llm_check(code, scene_data):
     """
-    Checks if the generated code matches the visual instructions.
+    Asks the LLM critic about a single scene.
     
-    Args:
-        code (str): The generated Manim code.
-        scene_data (dict): The scene requirements.
-        
     Returns:
-        tuple: (passed (bool), feedback (str))
+        tuple: (passed, feedback (str)); passed is None when the critic could
+        not give a verdict (the scene is unchecked, not passed).
     """
     user_prompt = f"""
     ### VISUAL INSTRUCTIONS:
@@ -55,22 +59,190 @@ def check_code(code, scene_data):
     Respond with JSON.
     """
     
-    model = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001")
+    model = default_model()
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": CHECKER_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
+        content = chat_completion(
+            model,
+            CHECKER_SYSTEM_PROMPT,
+            user_prompt,
             temperature=0.1,
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         return result.get("passed", False), result.get("feedback", "")
         
     except Exception as e:
-        print(f"Check failed: {e}")
-        return True, "" # Assume pass if checker fails to avoid blocking
+        # Transient API errors were already retried by llm; anything left is
+        # persistent (bad JSON, auth...). Don't block the scene on the critic,
+        # but don't count it as a pass either.
+        print(f"Check failed after retries, scene left unchecked: {e}")
+        with _stats_lock:
+            _stats['unchecked'] += 1
+        return None, f"Quality check unavailable: {e}"
+
+def _llm_check_batch(items):
+    """
+    Asks the LLM critic about several scenes in one JSON request.
+    
+    Args:
+        items (list): (code, scene_data) pairs.
+        
+    Returns:
+        list: (passed, feedback) per item, in order. Scenes the model leaves
+        out of its answer are checked individually.
+    """
+    sections = []
+    for i, (code, scene_data) in enumerate(items):
+        sections.append(f"""
+    ### SCENE {i}
+    #### VISUAL INSTRUCTIONS:
+    {scene_data['visual_instruction']}
+    
+    #### GENERATED CODE:
+    {code}
+    """)
+    
+    user_prompt = "".join(sections) + """
+    ### TASK:
+    Review each scene independently. Does its code fulfill its instructions?
+    - If it misses key elements (like quantity of objects, specific animations), fail it.
+    - If it uses text labels instead of shapes for objects (like "Bank" text instead of a rectangle), fail it.
+    
+    Respond with JSON: {"results": [{"index": <scene number>, "passed": boolean, "feedback": "string"}, ...]}
+    with exactly one entry per scene.
+    """
+    
+    results = {}
+    try:
+        content = chat_completion(
+            default_model(),
+            CHECKER_SYSTEM_PROMPT,
+            user_prompt,
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        )
+        for entry in json.loads(content).get("results", []):
+            results[int(entry["index"])] = (entry.get("passed", False), entry.get("feedback", ""))
+    except Exception as e:
+        print(f"Batched check failed, checking scenes individually: {e}")
+    
+    return [results[i] if i in results else _llm_check(*items[i]) for i in range(len(items))]
+
+class _CriticBatcher:
+    """
+    Collects concurrent critic requests and sends them as batches.
+    
+    A batch is sent as soon as it holds BATCH_SIZE scenes, or BATCH_WINDOW
+    seconds after its first scene arrived, whichever comes first. When only
+    one check can be in flight, nothing can join it: it is sent at once.
+    """
+
+    def __init__(self, max_batch, window):
+        self.max_batch = max_batch
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def submit(self, code, scene_data):
+        """Blocks until the critic has judged this scene. Returns (passed, feedback)."""
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((code, scene_data, future))
+            if len(self._pending) >= self.max_batch or _max_in_flight == 1:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._send(batch)
+        return future.result()
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        with _stats_lock:
+            _stats['llm_scenes'] += len(batch)
+            _stats['llm_requests'] += 1
+        try:
+            # May run on the batch timer's thread: the critic call gets its own span
+            with tracing.span("critic batch", scenes=len(batch)):
+                if len(batch) == 1:
+                    code, scene_data, _ = batch[0]
+                    results = [_llm_check(code, scene_data)]
+                else:
+                    results = _llm_check_batch([(code, scene_data) for code, scene_data, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+_batcher = _CriticBatcher(BATCH_SIZE, BATCH_WINDOW)
+
+def set_max_in_flight(n):
+    """
+    Tells the critic batcher how many checks can run at once.
+    
+    Args:
+        n (int): Concurrent scenes times candidates per scene.
+    """
+    global _max_in_flight
+    _max_in_flight = max(1, n)
+
+def check_code(code, scene_data):
+    """
+    Checks if the generated code matches the visual instructions.
+    
+    A deterministic local tier (local_checker) decides whenever the
+    instructions are mechanically checkable; only inconclusive scenes go to
+    the LLM critic, batched with other scenes waiting at the same time.
+    
+    Args:
+        code (str): The generated Manim code.
+        scene_data (dict): The scene requirements.
+        
+    Returns:
+        tuple: (passed, feedback (str)); passed is True, False, or None when
+        the critic failed and the scene could not be checked.
+    """
+    verdict, feedback = local_check(code, scene_data)
+    if verdict is not None:
+        with _stats_lock:
+            _stats['local_pass' if verdict else 'local_fail'] += 1
+        return verdict, feedback
+    
+    return _batcher.submit(code, scene_data)
+
+def stats_summary():
+    """
+    Summarises how checks were decided.
+    
+    Returns:
+        str: One-line summary, or "" if nothing was checked.
+    """
+    with _stats_lock:
+        local = _stats['local_pass'] + _stats['local_fail']
+        if not local and not _stats['llm_scenes'] and not _stats['unchecked']:
+            return ""
+        summary = (f"{local} decided locally ({_stats['local_pass']} passed, {_stats['local_fail']} failed), "
+                   f"{_stats['llm_scenes']} sent to the LLM critic in {_stats['llm_requests']} requests")
+        if _stats['unchecked']:
+            summary += f", {_stats['unchecked']} left unchecked (critic errors)"
+        return summary
@@ -1,13 +1,4 @@
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-)
+from llm import default_model, chat_completion, stream_code_completion, streaming_enabled, strip_fences, StreamAborted
 
 SYSTEM_PROMPT = """You are a Manim Code Generator. You output ONLY valid Python code inside a construct(self): method. Do not output the class definition, just the code inside.
 
@@ -41,21 +32,50 @@ VISUAL FIDELITY (Crucial):
 - If an animation is described (e.g., "rejected stamp"), create a visual representation of that (e.g., a red "REJECTED" text with a box around it, appearing with a `ScaleInPlace` animation).
 """
 
-def generate_scene_code(scene_data):
+def estimate_duration(narrative):
+    """
+    Estimates how long a scene must last for its narrative to be read aloud.
+    
+    Args:
+        narrative (str): The scene's voiceover text.
+        
+    Returns:
+        float: Duration in seconds.
+    """
+    # Avg reading speed: 150 wpm = 2.5 words/sec
+    word_count = len(narrative.split())
+    return max(2.0, word_count / 2.5) # Minimum 2 seconds
+
+PREVIOUS_SCENE_PROMPT = """
+    ### PREVIOUS SCENE: {scene_name}
+    This scene continues in the same construct() right after the previous scene's code:
+{code}
+
+    Its variables ({names}) still hold its mobjects, and whatever it left on screen is still there.
+    When the instructions keep, move or transform objects from the previous scene, reuse these
+    variables instead of rebuilding the objects, and remove what is no longer needed.
+    If you reuse none of them, the screen is cleared for you before your code runs.
+    Do not call self.next_section(); scene boundaries are handled for you.
+    """
+
+def generate_scene_code(scene_data, stream=None, sample=0, cancel_event=None, previous=None):
     """
     Generates Manim code for a single scene using OpenRouter.
     
     Args:
         scene_data (dict): {'scene_name': str, 'narrative': str, 'visual_instruction': str}
+        stream (bool): Stream the completion and abort early on unusable output.
+                       Defaults to the global streaming setting (--stream).
+        sample (int): Candidate index when several are requested for one scene.
+        cancel_event (threading.Event): Lets a speculative caller cancel a streamed generation.
+        previous (dict): {'scene_name', 'code', 'names'} of the scene rendered just before
+                         this one in the same Scene (continuous mode), so its mobjects can be reused.
         
     Returns:
         str: The generated Python code for the construct method.
     """
     # Calculate estimated duration based on narrative word count
-    # Avg reading speed: 150 wpm = 2.5 words/sec
-    narrative = scene_data.get('narrative', "")
-    word_count = len(narrative.split())
-    estimated_duration = max(2.0, word_count / 2.5) # Minimum 2 seconds
+    estimated_duration = estimate_duration(scene_data.get('narrative', ""))
     
     user_prompt = f"""
     Scene Name: {scene_data['scene_name']}
@@ -66,26 +86,41 @@ def generate_scene_code(scene_data):
     Generate the Manim code for this scene. Ensure the total wait time matches the estimated duration.
     Make the visuals rich and composed of shapes, not just text labels.
     """
+    if previous:
+        user_prompt += PREVIOUS_SCENE_PROMPT.format(
+            scene_name=previous['scene_name'],
+            code=previous['code'],
+            names=", ".join(previous['names']) or "none",
+        )
     
-    model = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001")
+    model = default_model()
     
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.7,
-    )
+    if stream is None:
+        stream = streaming_enabled()
     
-    code = response.choices[0].message.content.strip()
+    if not stream:
+        content = chat_completion(
+            model,
+            SYSTEM_PROMPT,
+            user_prompt,
+            temperature=0.7,
+            sample=sample,
+        )
+        # Cleanup if the LLM still adds markdown fences despite instructions
+        return strip_fences(content)
     
-    # Cleanup if the LLM still adds markdown fences despite instructions
-    if code.startswith("```python"):
-        code = code[9:]
-    if code.startswith("```"):
-        code = code[3:]
-    if code.endswith("```"):
-        code = code[:-3]
-        
-    return code.strip()
+    # Streaming: an aborted generation (prose, runaway length) gets one fresh sample
+    for attempt in range(2):
+        try:
+            return stream_code_completion(
+                model,
+                SYSTEM_PROMPT,
+                user_prompt,
+                temperature=0.7,
+                sample=sample,
+                cancel_event=cancel_event,
+            )
+        except StreamAborted as e:
+            if attempt == 1 or (cancel_event is not None and cancel_event.is_set()):
+                raise
+            print(f"Generation for {scene_data['scene_name']} aborted ({e}), retrying...")
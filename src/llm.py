@@ -0,0 +1,483 @@
+import codeop
+import os
+import random
+import threading
+import time
+import warnings
+from email.utils import parsedate_to_datetime
+
+from cache import DiskCache, cache_key
+import tracing
+
+BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+DEFAULT_MODEL = "google/gemini-2.0-flash-001"
+
+# Explicit per-call timeout (seconds) and connection pool size for the shared client
+REQUEST_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "120"))
+MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "16"))
+
+# Retries on 429 / 5xx / connection errors, with jittered exponential backoff
+MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# Rough completion size used to reserve tokens before a call (reconciled with usage after)
+EXPECTED_COMPLETION_TOKENS = 1000
+
+_client = None
+_client_lock = threading.Lock()
+_env_loaded = False
+
+# Completions are small, so 50 MB holds tens of thousands of scenes.
+_completions = DiskCache(
+    "llm",
+    max_bytes=int(os.getenv("MANIMATOR_LLM_CACHE_MB", "50")) * 1024 * 1024,
+)
+
+# Streaming mode for code completions (--stream or MANIMATOR_STREAM=1)
+_stream = bool(os.getenv("MANIMATOR_STREAM"))
+
+# A construct body longer than this is a runaway generation, not a scene
+MAX_CODE_CHARS = int(os.getenv("MANIMATOR_MAX_CODE_CHARS", "12000"))
+
+
+# Per-call streaming metrics: {'model', 'ttft', 'duration', 'tokens', 'tokens_per_sec', 'aborted'}
+_metrics = []
+_metrics_lock = threading.Lock()
+
+class StreamAborted(Exception):
+    """Raised when a streamed completion is cancelled because the output is unusable."""
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+    
+    acquire() blocks until enough budget is available, so concurrent scenes
+    are smoothed out instead of bursting into 429s.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # A single request larger than the bucket could never fit; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, delta):
+        """Corrects a reservation once the real cost is known (positive delta = spent more)."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+def _bucket_from_env(name):
+    value = os.getenv(name)
+    return TokenBucket(float(value)) if value else None
+
+# Requests-per-minute and tokens-per-minute limits (unset = unlimited)
+_request_bucket = _bucket_from_env("OPENROUTER_RPM")
+_token_bucket = _bucket_from_env("OPENROUTER_TPM")
+
+def configure_rate_limits(rpm=None, tpm=None):
+    """
+    Sets the shared request and token rate limits.
+    
+    Args:
+        rpm (float): Maximum requests per minute, or None to keep the current limit.
+        tpm (float): Maximum (prompt + completion) tokens per minute, or None to keep the current limit.
+    """
+    global _request_bucket, _token_bucket
+    if rpm:
+        _request_bucket = TokenBucket(rpm)
+    if tpm:
+        _token_bucket = TokenBucket(tpm)
+
+def _load_env():
+    """Reads .env into os.environ once per process (callers hold _client_lock)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def default_model():
+    """Returns the configured OpenRouter model (OPENROUTER_MODEL)."""
+    with _client_lock:
+        _load_env()
+    return os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL)
+
+def get_client():
+    """
+    Returns the process-wide OpenAI client for OpenRouter, creating it on first use.
+    
+    The client keeps a pool of keep-alive connections so concurrent scenes
+    reuse TCP/TLS sessions. Its own retries are disabled: _call_with_retries
+    handles them with rate limiting and Retry-After support.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+
+            _load_env()
+            _client = OpenAI(
+                base_url=BASE_URL,
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                max_retries=0,
+                timeout=REQUEST_TIMEOUT,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_CONNECTIONS,
+                        keepalive_expiry=60,
+                    ),
+                    timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+                ),
+            )
+        return _client
+
+def _retry_after(error):
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+def _call_with_retries(create, estimated_tokens):
+    """
+    Runs create() under the shared rate limits, retrying transient failures.
+    
+    Backoff is exponential with full jitter, capped at BACKOFF_CAP, and a
+    server-provided Retry-After always wins.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if _request_bucket:
+            _request_bucket.acquire(1)
+        if _token_bucket:
+            _token_bucket.acquire(estimated_tokens)
+        try:
+            return create()
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{MAX_RETRIES})...")
+            tracing.add(retries=1)
+            time.sleep(delay)
+
+def _estimate_tokens(system_prompt, user_prompt):
+    # ~4 characters per token is close enough for budgeting
+    return (len(system_prompt) + len(user_prompt)) // 4 + EXPECTED_COMPLETION_TOKENS
+
+def _reconcile_tokens(usage, estimated_tokens):
+    if _token_bucket and usage is not None and getattr(usage, "total_tokens", None):
+        _token_bucket.adjust(usage.total_tokens - estimated_tokens)
+
+def _trace_usage(model, usage):
+    # OpenRouter reports the charged cost in usage.cost when usage accounting is requested
+    tracing.add(
+        model=model,
+        llm_calls=1,
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+        cost=getattr(usage, "cost", None),
+    )
+
+def set_streaming(enabled):
+    """Enables or disables streaming for code completions."""
+    global _stream
+    _stream = enabled
+
+def streaming_enabled():
+    return _stream
+
+def strip_fences(code):
+    """Removes markdown code fences the LLM may add despite instructions."""
+    code = code.strip()
+    if code.startswith("```python"):
+        code = code[9:]
+    if code.startswith("```"):
+        code = code[3:]
+    if code.endswith("```"):
+        code = code[:-3]
+    return code.strip()
+
+def _request_key(model, system_prompt, user_prompt, temperature, kwargs, sample):
+    # Sample 0 is the ordinary request; speculative siblings get their own entries
+    if sample:
+        return cache_key(model, system_prompt, user_prompt, temperature, kwargs, sample)
+    return cache_key(model, system_prompt, user_prompt, temperature, kwargs)
+
+def chat_completion(model, system_prompt, user_prompt, temperature, sample=0, **kwargs):
+    """
+    Runs a chat completion, serving repeated requests from the on-disk cache.
+    
+    The cache key covers everything that determines the completion: model,
+    both prompts, temperature and any extra request options (e.g. response_format).
+    
+    Args:
+        model (str): Model name.
+        system_prompt (str): System message.
+        user_prompt (str): User message.
+        temperature (float): Sampling temperature.
+        sample (int): Index of an independent sample of the same request
+            (speculative candidates); each index is cached separately.
+        **kwargs: Extra options forwarded to chat.completions.create.
+        
+    Returns:
+        str: The completion's message content.
+    """
+    key = _request_key(model, system_prompt, user_prompt, temperature, kwargs, sample)
+    cached = _completions.get(key)
+    if cached is not None:
+        tracing.add(model=model, cache_hits=1)
+        return cached["content"]
+
+    estimated_tokens = _estimate_tokens(system_prompt, user_prompt)
+    response = _call_with_retries(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            timeout=REQUEST_TIMEOUT,
+            extra_body={"usage": {"include": True}},
+            **kwargs
+        ),
+        estimated_tokens,
+    )
+    _reconcile_tokens(getattr(response, "usage", None), estimated_tokens)
+    _trace_usage(model, getattr(response, "usage", None))
+
+    content = response.choices[0].message.content
+    _completions.put(key, {"model": model, "content": content})
+    return content
+
+def _looks_like_prose(line):
+    """Whether the first line of a completion is chat rather than the start of Python code."""
+    if line.startswith("#"):
+        return False
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", SyntaxWarning)
+            # None (incomplete, e.g. "title = Text(") is fine: the statement continues below
+            codeop.compile_command(line, symbol="exec")
+    except (SyntaxError, ValueError, OverflowError):
+        return True
+    return False
+
+def _extract_code(text):
+    """
+    The code part of a completion, as the stream keeps it: fences dropped,
+    and everything from the closing fence on (commentary) cut off.
+    """
+    lines = []
+    for line in text.split("\n"):
+        if line.strip().startswith("```"):
+            if any(kept.strip() for kept in lines):
+                break
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+def _record(model, start, first_token_at, tokens, aborted):
+    end = time.perf_counter()
+    ttft = (first_token_at - start) if first_token_at else None
+    generation_time = (end - first_token_at) if first_token_at else 0.0
+    with _metrics_lock:
+        _metrics.append({
+            'model': model,
+            'ttft': ttft,
+            'duration': end - start,
+            'tokens': tokens,
+            'tokens_per_sec': tokens / generation_time if generation_time > 0 else None,
+            'aborted': aborted,
+        })
+
+def stream_code_completion(model, system_prompt, user_prompt, temperature, max_chars=None,
+                           sample=0, cancel_event=None, **kwargs):
+    """
+    Streams a code completion, assembling and de-fencing it as chunks arrive.
+    
+    The request is cancelled early when the output is clearly unusable: the
+    first line is prose instead of code, or the code grows past max_chars.
+    A closing markdown fence ends the stream, since anything after it is
+    commentary. Successful completions share the cache with chat_completion.
+    
+    Args:
+        model (str): Model name.
+        system_prompt (str): System message.
+        user_prompt (str): User message.
+        temperature (float): Sampling temperature.
+        max_chars (int): Abort threshold (default MAX_CODE_CHARS).
+        sample (int): Index of an independent sample (see chat_completion).
+        cancel_event (threading.Event): Cancels the stream as soon as it is set.
+        **kwargs: Extra options forwarded to chat.completions.create.
+        
+    Returns:
+        str: The assembled code, without markdown fences.
+        
+    Raises:
+        StreamAborted: If the output was judged unusable mid-stream, or cancelled.
+    """
+    key = _request_key(model, system_prompt, user_prompt, temperature, kwargs, sample)
+    cached = _completions.get(key)
+    if cached is not None:
+        tracing.add(model=model, cache_hits=1)
+        # The entry may come from chat_completion, which stores the raw reply
+        return _extract_code(cached["content"])
+
+    max_chars = max_chars or MAX_CODE_CHARS
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    usage_tokens = None
+
+    # Only opening the stream is retried; once tokens flow, errors propagate
+    estimated_tokens = _estimate_tokens(system_prompt, user_prompt)
+    stream = _call_with_retries(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=REQUEST_TIMEOUT,
+            extra_body={"usage": {"include": True}},
+            **kwargs
+        ),
+        estimated_tokens,
+    )
+    usage = None
+
+    lines = []       # completed code lines
+    pending = ""     # current, not yet terminated line
+    seen_code = False
+    done = False
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise StreamAborted("cancelled")
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+                usage_tokens = usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += 1
+
+            pending += delta
+            while "\n" in pending:
+                line, pending = pending.split("\n", 1)
+                stripped = line.strip()
+                if stripped.startswith("```"):
+                    if seen_code:
+                        # Closing fence: the code is complete
+                        done = True
+                        break
+                    continue # Opening fence
+                if stripped and not seen_code:
+                    seen_code = True
+                    if _looks_like_prose(stripped):
+                        raise StreamAborted(f"prose instead of code: {stripped[:60]!r}")
+                lines.append(line)
+            if done:
+                break
+
+            if sum(len(line) + 1 for line in lines) + len(pending) > max_chars:
+                raise StreamAborted(f"runaway generation over {max_chars} characters")
+    except StreamAborted as e:
+        _record(model, start, first_token_at, tokens, str(e))
+        _trace_usage(model, usage)
+        raise
+    finally:
+        # Cancels the HTTP request if we stopped reading early
+        stream.close()
+
+    if not done and pending.strip() and not pending.strip().startswith("```"):
+        lines.append(pending)
+
+    _record(model, start, first_token_at, usage_tokens or tokens, None)
+    _reconcile_tokens(usage, estimated_tokens)
+    _trace_usage(model, usage)
+
+    code = "\n".join(lines).strip()
+    _completions.put(key, {"model": model, "content": code})
+    return code
+
+def metrics():
+    """Returns a copy of the per-call streaming metrics recorded so far."""
+    with _metrics_lock:
+        return list(_metrics)
+
+def metrics_summary():
+    """
+    Summarises streaming metrics for the run.
+    
+    Returns:
+        str: One-line summary, or "" if nothing was streamed.
+    """
+    calls = metrics()
+    if not calls:
+        return ""
+    ttfts = [c['ttft'] for c in calls if c['ttft'] is not None]
+    rates = [c['tokens_per_sec'] for c in calls if c['tokens_per_sec']]
+    aborted = sum(1 for c in calls if c['aborted'])
+    avg_ttft = sum(ttfts) / len(ttfts) if ttfts else 0.0
+    avg_rate = sum(rates) / len(rates) if rates else 0.0
+    return (f"{len(calls)} streamed calls, avg time-to-first-token {avg_ttft:.2f}s, "
+            f"avg {avg_rate:.1f} tokens/s, {aborted} aborted early")
+
+def clear_cache():
+    """Drops every cached completion."""
+    _completions.clear()
@@ -0,0 +1,276 @@
+import ast
+import re
+
+from generator import estimate_duration
+from validator import normalize_code
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+
+# Countable nouns in visual instructions -> manim classes that satisfy them
+SHAPE_NOUNS = {
+    "square": {"Square", "Rectangle", "RoundedRectangle"},
+    "block": {"Square", "Rectangle", "RoundedRectangle"},
+    "box": {"Square", "Rectangle", "RoundedRectangle"},
+    "rectangle": {"Rectangle", "RoundedRectangle", "Square"},
+    "circle": {"Circle", "Dot", "Annulus"},
+    "dot": {"Dot", "Circle"},
+    "node": {"Circle", "Dot"},
+    "arrow": {"Arrow", "CurvedArrow", "DoubleArrow"},
+    "line": {"Line", "DashedLine", "Arrow"},
+    "triangle": {"Triangle", "Polygon", "RegularPolygon"},
+    "star": {"Star"},
+}
+
+COUNT_PATTERN = re.compile(
+    r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")\s+(?:[a-z-]+\s+){0,2}?("
+    + "|".join(SHAPE_NOUNS) + r")(?:e?s)?\b(?!\s+of\b)",  # "3 lines of text" counts no Line objects
+    re.IGNORECASE,
+)
+
+# White/black are defaults or backgrounds, so they are not checked
+COLOR_WORDS = ["red", "blue", "green", "yellow", "orange", "purple", "pink", "gold", "teal", "maroon", "grey", "gray"]
+
+# "avoid red", "no blue", "instead of green": the color is not a requirement to use it
+NEGATION = re.compile(r"\b(?:no|not|avoid|avoiding|without|never|except|instead of|rather than|don't)\s+"
+                      r"(?:[a-z-]+\s+){0,2}$")
+
+# Words that carry no requirement of their own. An instruction is only decided
+# locally when every other word in it was matched by one of the rules.
+FILLER_WORDS = {
+    "a", "an", "the", "and", "with", "of", "each", "all", "them", "it", "its", "then", "is", "are", "be",
+    "show", "shows", "showing", "display", "displays", "draw", "draws", "create", "creates", "add", "adds",
+    "make", "put", "place", "colored", "coloured", "filled", "in", "on", "screen",
+}
+
+# Objects the generator must compose from shapes rather than write as a label.
+# Only matched in a drawing context ("draw a lock", "key icon"): "three key points" is text.
+ICON_NOUNS = {
+    "bank", "server", "notebook", "person", "people", "stick figure", "building", "computer",
+    "laptop", "phone", "lock", "padlock", "key", "coin", "wallet", "house", "document",
+    "book", "database", "cloud", "shield", "globe", "stamp", "ledger",
+}
+ICON_CONTEXT = (r"\b(?:draw|draws|drawn|drawing|sketch)\s+(?:[a-z-]+\s+){{0,2}}?{noun}s?\b"
+                r"|\b{noun}s?\s+(?:icon|symbol|shape|drawing|illustration)s?\b"
+                r"|\bicons?\s+of\s+(?:[a-z-]+\s+){{0,2}}?{noun}s?\b")
+
+# Scenes whose waits fall this far short of the narrative are failed
+WAIT_TOLERANCE = 0.8
+
+def _constant_int(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    return None
+
+def _wait_seconds(call):
+    """Duration of a self.wait(...) call, or None if it isn't a literal."""
+    duration = call.args[0] if call.args else None
+    for keyword in call.keywords:
+        if keyword.arg == "duration":
+            duration = keyword.value
+    if duration is None:
+        return 1.0 # manim's default
+    if isinstance(duration, ast.Constant) and isinstance(duration.value, (int, float)):
+        return float(duration.value)
+    return None
+
+def _iterations(iterable):
+    """Number of iterations for range(N) / literal sequences, or None if unknown."""
+    if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+        return len(iterable.elts)
+    if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name):
+        if iterable.func.id == "range":
+            args = [_constant_int(arg) for arg in iterable.args]
+            if None in args or not args:
+                return None
+            return len(range(*args))
+        if iterable.func.id == "enumerate" and iterable.args:
+            return _iterations(iterable.args[0])
+    return None
+
+class _SceneFacts(ast.NodeVisitor):
+    """
+    Collects constructor counts and wait time from a construct body.
+
+    Loops with a statically known trip count multiply whatever they
+    contain; anything inside an unknown loop is marked uncertain.
+    """
+
+    def __init__(self):
+        self.multiplier = 1
+        self.uncertain = 0      # >0 while inside a loop of unknown length
+        self.counts = {}        # class name -> known minimum count
+        self.uncertain_classes = set()
+        self.wait_seconds = 0.0
+        self.wait_uncertain = False
+        self.copies = False
+        self.helpers = False
+
+    def _loop(self, iterations, body):
+        saved = (self.multiplier, self.uncertain)
+        if iterations is None:
+            self.uncertain += 1
+        else:
+            self.multiplier *= iterations
+        for node in body:
+            self.visit(node)
+        self.multiplier, self.uncertain = saved
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self._loop(_iterations(node.iter), node.body)
+        for stmt in node.orelse:
+            self.visit(stmt)
+
+    def visit_While(self, node):
+        self._loop(None, node.body)
+
+    def _comprehension(self, node, elements):
+        iterations = 1
+        for generator in node.generators:
+            self.visit(generator.iter)
+            n = _iterations(generator.iter)
+            iterations = None if (n is None or iterations is None or generator.ifs) else iterations * n
+        self._loop(iterations, elements)
+
+    def visit_ListComp(self, node):
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._comprehension(node, [node.key, node.value])
+
+    def visit_FunctionDef(self, node):
+        # Helpers may be called any number of times: their contents can't be counted
+        self.helpers = True
+        self._loop(None, node.body)
+
+    def visit_Lambda(self, node):
+        self.helpers = True
+        self._loop(None, [node.body])
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name):
+            if self.uncertain:
+                self.uncertain_classes.add(func.id)
+            else:
+                self.counts[func.id] = self.counts.get(func.id, 0) + self.multiplier
+        elif isinstance(func, ast.Attribute):
+            if func.attr == "copy":
+                self.copies = True
+            if func.attr == "wait" and isinstance(func.value, ast.Name) and func.value.id == "self":
+                seconds = _wait_seconds(node)
+                if seconds is None or self.uncertain:
+                    self.wait_uncertain = True
+                else:
+                    self.wait_seconds += seconds * self.multiplier
+        self.generic_visit(node)
+
+def _requirement(match):
+    """(noun, count) of a COUNT_PATTERN match such as "3 squares" or "three red circles"."""
+    number = match.group(1).lower()
+    count = int(number) if number.isdigit() else NUMBER_WORDS[number]
+    return match.group(2).lower(), count
+
+def _fully_covered(lowered, covered):
+    """Whether every word of the instruction is filler or inside a span a rule checked."""
+    for word in re.finditer(r"[a-z0-9']+", lowered):
+        if word.group() in FILLER_WORDS:
+            continue
+        if not any(start <= word.start() and word.end() <= end for start, end in covered):
+            return False
+    return True
+
+def _code_has_color(code, color):
+    constant = "GRAY" if color in ("grey", "gray") else color.upper()
+    if re.search(rf"\b(PURE_|LIGHT_|DARK_)?{constant}(_[A-E])?\b", code):
+        return True
+    if constant == "GRAY" and re.search(r"\b(LIGHT_|DARK_)?GREY\b", code):
+        return True
+    return re.search(rf"[\"']{color}[\"']", code, re.IGNORECASE) is not None
+
+def local_check(code, scene_data):
+    """
+    Deterministic, AST-based version of the critic's mechanical checks.
+
+    Checks object counts ("Show 3 blocks"), requested colors and total
+    self.wait() time against the narrative's estimated duration. Drawn
+    objects ("draw a bank") always go to the critic. A scene only passes here when those rules cover
+    every requirement in the instructions; anything else ("an arrow from
+    Alice to Bob") is left to the LLM critic.
+
+    Args:
+        code (str): The generated Manim code.
+        scene_data (dict): The scene requirements.
+
+    Returns:
+        tuple: (verdict, feedback) where verdict is True (passed), False
+        (failed, feedback says why) or None when the instructions ask for
+        things only the LLM critic can judge.
+    """
+    try:
+        tree = ast.parse(normalize_code(code))
+    except SyntaxError:
+        # Not our call: the renderer's validator/repairer handle broken code
+        return None, ""
+
+    instruction = scene_data['visual_instruction']
+    lowered = instruction.lower()
+    facts = _SceneFacts()
+    facts.visit(tree)
+
+    problems = []
+    inconclusive = False
+    covered = [] # character spans of the instruction a rule has checked
+
+    # Object counts
+    count_is_exact = not (facts.copies or facts.helpers)
+    for match in COUNT_PATTERN.finditer(instruction):
+        covered += [match.span(1), (match.start(2), match.end())]
+        noun, required = _requirement(match)
+        classes = SHAPE_NOUNS[noun]
+        found = sum(facts.counts.get(cls, 0) for cls in classes)
+        if found >= required:
+            continue
+        if count_is_exact and not (classes & facts.uncertain_classes):
+            problems.append(f"Instructions ask for {required} {noun}(s) but the code creates only {found}.")
+        else:
+            inconclusive = True
+
+    # Colors
+    for color in COLOR_WORDS:
+        mentions = [match for match in re.finditer(rf"\b{color}\b", lowered)
+                    if not NEGATION.search(lowered[:match.start()])]
+        if not mentions:
+            continue
+        covered += [match.span() for match in mentions]
+        if not _code_has_color(code, color):
+            if re.search(r"#[0-9a-fA-F]{6}\b", code):
+                inconclusive = True # A hex value might be the requested color
+            else:
+                problems.append(f"Instructions mention {color} but the code never uses {color.upper()}.")
+
+    # Drawn objects: whether the code draws a bank or just writes "Bank" (or
+    # whether its shapes look like one) is for the LLM critic
+    if any(re.search(ICON_CONTEXT.format(noun=noun), lowered) for noun in ICON_NOUNS):
+        inconclusive = True
+
+    # Pacing
+    needed = estimate_duration(scene_data.get('narrative', ""))
+    if facts.wait_uncertain:
+        if facts.wait_seconds < needed * WAIT_TOLERANCE:
+            inconclusive = True
+    elif facts.wait_seconds < needed * WAIT_TOLERANCE:
+        problems.append(f"Total self.wait() time is {facts.wait_seconds:.1f}s but the narrative needs about "
+                        f"{needed:.1f}s. Add waits after animations.")
+
+    if problems:
+        return False, " ".join(problems)
+    if inconclusive or not _fully_covered(lowered, covered):
+        return None, ""
+    return True, ""
@@ -1,106 +1,320 @@
 import argparse
 import os
 import sys
-import subprocess
-from rich.console import Console
-from dotenv import load_dotenv
 
 # Add src to path so we can import modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from parser import parse_markdown
-from generator import generate_scene_code
-from renderer import render_code
+# Heavy modules (rich, openai, the pipeline) are imported inside the commands
+# that need them, so --help, `plan` and argument errors start instantly.
 
-load_dotenv()
-console = Console()
-
-def main():
-    parser = argparse.ArgumentParser(description="Manimator: Convert Markdown to Manim Video")
+def plan(argv):
+    """
+    `main.py plan <input_file>`: show the scenes and their timing without any network calls.
+    """
+    parser = argparse.ArgumentParser(prog="main.py plan",
+                                     description="List the scenes of a script with estimated durations")
     parser.add_argument("input_file", help="Path to the input markdown file")
-    
-    args = parser.parse_args()
-    
+    args = parser.parse_args(argv)
+
     if not os.path.exists(args.input_file):
-        console.print(f"[bold red]Input file not found: {args.input_file}[/bold red]")
-        return
+        parser.error(f"Input file not found: {args.input_file}")
+
+    from parser import parse_markdown
+    from generator import estimate_duration
+
+    scenes = parse_markdown(args.input_file)
+    name_width = max([len("Scene")] + [len(scene['scene_name']) for scene in scenes])
+
+    print(f"{'#':>3}  {'Scene':<{name_width}}  {'Words':>5}  {'Duration':>8}")
+    total_words = 0
+    total_duration = 0.0
+    for i, scene in enumerate(scenes, 1):
+        words = len(scene['narrative'].split())
+        duration = estimate_duration(scene['narrative'])
+        total_words += words
+        total_duration += duration
+        print(f"{i:>3}  {scene['scene_name']:<{name_width}}  {words:>5}  {duration:>7.1f}s")
+    print(f"{'':>3}  {'Total':<{name_width}}  {total_words:>5}  {total_duration:>7.1f}s")
+
+def print_summaries(console, trace_file=None, input_file=None):
+    """Prints the per-run statistics, and writes the Chrome trace if one was requested."""
+    import checker
+    import llm
+    import repair_memo
+    import speculation
+    import tracing
+
+    tracing.print_summary(console)
+    summaries = [
+        ("LLM streaming", llm.metrics_summary()),
+        ("Quality checks", checker.stats_summary()),
+        ("Repairs", repair_memo.stats_summary()),
+        ("Speculation", speculation.stats_summary()),
+    ]
+    for label, summary in summaries:
+        if summary:
+            console.print(f"[dim]{label}: {summary}[/dim]")
+
+    if trace_file:
+        tracing.export_chrome_trace(trace_file, process_name=f"manimator {input_file}")
+        console.print(f"[dim]Trace written to {os.path.abspath(trace_file)}[/dim]")
+
+def add_pipeline_arguments(parser):
+    """Options shared by every command that runs the pipeline (run, batch)."""
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of scenes to process concurrently (default: 1)")
+    parser.add_argument("--render-jobs", type=int, default=None,
+                        help="Maximum concurrent manim renders (default: min(jobs, CPU count))")
+    parser.add_argument("--no-warm-workers", action="store_true",
+                        help="Render with a fresh manim CLI process per attempt instead of warm workers")
+    parser.add_argument("--quality", choices=["low", "medium", "high", "production", "4k"], default=None,
+                        help="Quality preset of the final render (default: MANIMATOR_QUALITY or low)")
+    parser.add_argument("--parallel-sections", type=int, metavar="N", default=None,
+                        help="Split each scene's final render at its sections into up to N parts rendered "
+                             "concurrently on warm workers, then joined losslessly. Parts count against "
+                             "--render-jobs (whose default then becomes at least min(N, CPU count)); "
+                             "default: MANIMATOR_PARALLEL_SECTIONS or off")
+    parser.add_argument("--validate-mode", choices=["skip", "dry-run", "full"], default=None,
+                        help="Cheap manim run used while repairing: last frame only (skip), every frame "
+                             "without output (dry-run), or a final-quality render every attempt (full); default: skip")
+    parser.add_argument("--repair-format", choices=["full", "edit", "diff"], default=None,
+                        help="What the repair model returns: the complete code (full), line-range edits (edit) "
+                             "or a unified diff (diff), applied locally; default: MANIMATOR_REPAIR_FORMAT or full")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="Write per-stage spans as a Chrome trace-event JSON file (open in Perfetto)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream code completions and cancel clearly unusable ones early")
+    parser.add_argument("--candidates", type=int, default=1,
+                        help="Generate K candidates per scene in parallel; the first valid one wins (default: 1)")
+    parser.add_argument("--speculation-budget", type=int, default=None,
+                        help="Cap on extra candidate generations for the whole run (default: no cap)")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="Max LLM requests per minute (default: OPENROUTER_RPM or unlimited)")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="Max LLM tokens per minute (default: OPENROUTER_TPM or unlimited)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the on-disk LLM cache (neither read nor write)")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Invalidate the on-disk LLM, render and Tex/text asset caches before running")
+
+def configure_pipeline(args):
+    """
+    Applies the shared pipeline options. Returns the number of concurrent scenes.
+    """
+    from renderer import set_max_renders, set_backend, set_parallel_sections, set_quality, set_validate_mode
+    import asset_cache
+    import cache
+    import checker
+    import llm
+    import render_cache
+    import repairer
+    import speculation
+
+    llm.configure_rate_limits(rpm=args.rpm, tpm=args.tpm)
+    if args.stream:
+        llm.set_streaming(True)
+    speculation.configure(candidates=args.candidates, budget=args.speculation_budget)
+    if args.no_cache:
+        cache.set_enabled(False)
+    if args.clear_cache:
+        llm.clear_cache()
+        render_cache.clear()
+        asset_cache.clear()
+
+    jobs = max(1, args.jobs)
+    checker.set_max_in_flight(jobs * max(1, args.candidates))
+    # Split scenes need render slots of their own to run their parts side by side
+    sections = args.parallel_sections
+    if sections is None:
+        sections = int(os.getenv("MANIMATOR_PARALLEL_SECTIONS", "0"))
+    render_jobs = args.render_jobs or min(max(jobs, sections), os.cpu_count() or 1)
+    set_max_renders(render_jobs)
+    if args.quality:
+        set_quality(args.quality)
+    if args.validate_mode:
+        set_validate_mode(args.validate_mode)
+    if args.parallel_sections is not None:
+        set_parallel_sections(args.parallel_sections)
+    if args.repair_format:
+        repairer.set_repair_format(args.repair_format)
+    if args.no_warm_workers:
+        set_backend("cli")
+    return jobs
+
+def start_console():
+    """
+    Loads .env and returns a rich Console, or None if the API key is missing.
+    """
+    from dotenv import load_dotenv
+    from rich.console import Console
+
+    load_dotenv()
+    console = Console()
 
     if not os.getenv("OPENROUTER_API_KEY"):
         console.print("[bold red]Error: OPENROUTER_API_KEY not found in .env[/bold red]")
+        return None
+    return console
+
+def run(argv):
+    """
+    `main.py [run] <input_file>`: generate, render and merge every scene.
+    """
+    parser = argparse.ArgumentParser(description="Manimator: Convert Markdown to Manim Video",
+                                     epilog="Use `main.py plan <input_file>` to preview scenes offline, "
+                                            "`main.py batch <dir>` to process many files.")
+    parser.add_argument("input_file", help="Path to the input markdown file")
+    parser.add_argument("--progressive", metavar="DIR", default=None,
+                        help="Keep an HLS playlist in DIR updated as scenes finish (failed scenes become black gaps)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and rebuild only the changed scenes whenever the input file is saved")
+    parser.add_argument("--continuous", action="store_true",
+                        help="Render all scenes as sections of one Scene in a single manim run; each scene "
+                             "can reuse the previous scene's objects (scenes are generated in order)")
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input_file):
+        parser.error(f"Input file not found: {args.input_file}")
+    if args.watch and args.progressive:
+        parser.error("--watch and --progressive cannot be combined")
+    if args.watch and args.continuous:
+        parser.error("--watch and --continuous cannot be combined")
+
+    console = start_console()
+    if console is None:
+        return
+
+    from parser import parse_markdown
+    from pipeline import run_pipeline, run_sequence, merge_videos
+    from renderer import quality_settings
+    import asset_cache
+    import render_cache
+    import render_worker
+    import tracing
+
+    jobs = configure_pipeline(args)
+
+    if args.watch:
+        from watch import watch
+        try:
+            watch(args.input_file, jobs=jobs)
+        finally:
+            render_worker.shutdown()
+        render_cache.gc()
+        asset_cache.gc()
+        print_summaries(console, args.trace, args.input_file)
         return
 
     console.print(f"[bold green]Processing {args.input_file}...[/bold green]")
-    
-    scenes = parse_markdown(args.input_file)
+
+    with tracing.span("parse"):
+        scenes = parse_markdown(args.input_file)
     console.print(f"Found {len(scenes)} scenes.")
-    
-    video_files = []
-    
-    for scene in scenes:
-        console.print(f"\n[bold cyan]Generating code for scene: {scene['scene_name']}...[/bold cyan]")
-        try:
-            code = generate_scene_code(scene)
-            
-            # Check code quality
-            console.print(f"[dim]Checking code quality...[/dim]")
-            from checker import check_code
-            passed, feedback = check_code(code, scene)
-            
-            if not passed:
-                console.print(f"[bold yellow]Quality Check Failed: {feedback}[/bold yellow]")
-                console.print(f"[bold yellow]Regenerating with feedback...[/bold yellow]")
-                # Regenerate with feedback (simple approach: append feedback to prompt)
-                # For now, we'll just re-call generate with a modified prompt or just trust the repairer for crashes.
-                # To properly regenerate, we'd need to modify generate_scene_code to accept feedback.
-                # Let's do a simple hack: update the visual instruction temporarily
-                original_instruction = scene['visual_instruction']
-                scene['visual_instruction'] += f"\n\nCRITICAL FEEDBACK FROM PREVIOUS ATTEMPT: {feedback}"
-                code = generate_scene_code(scene)
-                scene['visual_instruction'] = original_instruction # Restore
-                
-                console.print(f"[bold green]Regenerated code.[/bold green]")
-            else:
-                console.print(f"[dim]Quality Check Passed.[/dim]")
-
-            video_path = render_code(code, scene['scene_name'])
-            if video_path:
-                video_files.append(video_path)
-            
-        except Exception as e:
-            console.print(f"[bold red]Failed to process scene {scene['scene_name']}: {e}[/bold red]")
+
+    playlist = None
+    if args.progressive:
+        from progressive import ProgressivePlaylist
+        settings = quality_settings()
+        playlist = ProgressivePlaylist(args.progressive, scenes, settings['pixel_width'],
+                                       settings['pixel_height'], settings['frame_rate'])
+        console.print(f"[bold green]Progressive output: {os.path.abspath(playlist.playlist_path)}[/bold green]")
+
+    try:
+        on_scene_done = playlist.scene_done if playlist else None
+        if args.continuous:
+            video_files = run_sequence(scenes, on_scene_done=on_scene_done)
+        else:
+            video_files = run_pipeline(scenes, jobs=jobs, on_scene_done=on_scene_done)
+    finally:
+        render_worker.shutdown()
+    if playlist:
+        playlist.finish()
 
     if video_files:
         console.print("\n[bold green]Merging videos...[/bold green]")
-        # Create a file list for ffmpeg
-        list_file = "video_list.txt"
-        with open(list_file, "w") as f:
-            for v in video_files:
-                # ffmpeg requires absolute paths or relative safe paths
-                abs_path = os.path.abspath(v)
-                f.write(f"file '{abs_path}'\n")
-        
-        output_merged = "final_video.mp4"
-        # ffmpeg command to concat
-        cmd = [
-            "ffmpeg",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", list_file,
-            "-c", "copy",
-            "-y", # overwrite
-            output_merged
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            console.print(f"[bold green]Final video saved to: {os.path.abspath(output_merged)}[/bold green]")
-        except subprocess.CalledProcessError as e:
+        output_merged = merge_videos(video_files)
+        if output_merged:
+            console.print(f"[bold green]Final video saved to: {output_merged}[/bold green]")
+        else:
             console.print("[bold red]Error merging videos![/bold red]")
-        finally:
-            if os.path.exists(list_file):
-                os.remove(list_file)
     else:
         console.print("[bold yellow]No videos were generated to merge.[/bold yellow]")
+    # Only after the merge: eviction must not take this run's own scenes
+    render_cache.gc()
+    asset_cache.gc()
+
+    print_summaries(console, args.trace, args.input_file)
+
+def batch(argv):
+    """
+    `main.py batch <inputs...>`: process many documents through shared pools, resumably.
+    """
+    parser = argparse.ArgumentParser(prog="main.py batch",
+                                     description="Process several markdown files (or directories of them) "
+                                                 "with a persistent job queue")
+    parser.add_argument("inputs", nargs="+", help="Markdown files and/or directories containing them")
+    parser.add_argument("--output-dir", default=os.path.join("output", "batch"),
+                        help="Where merged videos (<document>.mp4) are written (default: output/batch)")
+    parser.add_argument("--db", default=None,
+                        help="SQLite job database (default: <output-dir>/batch.sqlite)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the run recorded in the job database instead of starting over")
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        parser.error(f"Input not found: {', '.join(missing)}")
+
+    console = start_console()
+    if console is None:
+        return
+
+    from batch import JobStore, find_documents, run_batch
+    import asset_cache
+    import render_cache
+    import render_worker
+
+    documents = find_documents(args.inputs)
+    if not documents:
+        parser.error("No markdown files found")
+
+    jobs = configure_pipeline(args)
+    store = JobStore(args.db or os.path.join(args.output_dir, "batch.sqlite"))
+    if not args.resume:
+        store.reset()
+
+    console.print(f"[bold green]Batch of {len(documents)} documents ({'resuming' if args.resume else 'fresh run'})...[/bold green]")
+    try:
+        outputs = run_batch(documents, store, jobs=jobs, output_dir=args.output_dir)
+    finally:
+        render_worker.shutdown()
+    render_cache.gc()
+    asset_cache.gc()
+
+    for stage, counts in store.summary().items():
+        console.print(f"[dim]{stage}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) + "[/dim]")
+    done = sum(1 for output in outputs.values() if output)
+    console.print(f"[bold green]{done}/{len(outputs)} documents merged this run.[/bold green]")
+
+    print_summaries(console, args.trace, "batch")
+
+COMMANDS = {
+    "plan": plan,
+    "run": run,
+    "batch": batch,
+}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # `main.py input.md` keeps working: the command defaults to `run`
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return run(argv)
 
 if __name__ == "__main__":
     main()
@@ -1,46 +1,70 @@
 import re
 
-def parse_markdown(file_path):
+SCENE_HEADER = re.compile(r'## Scene:\s*(.*)')
+
+def _scene_from_chunk(scene_name, scene_content):
+    """Builds a scene dict from a scene's name and the text below its header."""
+    # Extract Narrative and Visual using simple string searching or regex
+    # Assuming format: **Narrative:** ... **Visual:** ...
+    # But let's be robust to variations like **Narrative**: or just Narrative:
+    
+    narrative_match = re.search(r'\*\*Narrative:?\*\*\s*(.*?)(?=\*\*Visual|\Z)', scene_content, re.DOTALL | re.IGNORECASE)
+    visual_match = re.search(r'\*\*Visual:?\*\*\s*(.*?)(?=$)', scene_content, re.DOTALL | re.IGNORECASE)
+    
+    narrative = narrative_match.group(1).strip() if narrative_match else ""
+    visual_instruction = visual_match.group(1).strip() if visual_match else ""
+    
+    return {
+        'scene_name': scene_name.strip(),
+        'narrative': narrative,
+        'visual_instruction': visual_instruction
+    }
+
+def iter_scenes(file_path):
     """
-    Parses a markdown file into a list of scene dictionaries.
+    Yields the scenes of a markdown file one at a time.
+    
+    The file is read line by line, so only the current scene is held in
+    memory (book-length scripts stream instead of loading whole).
     
     Args:
         file_path (str): Path to the markdown file.
         
-    Returns:
-        list: A list of dicts, e.g., [{'scene_name': 'Intro', 'narrative': '...', 'visual_instruction': '...'}]
+    Yields:
+        dict: {'scene_name': str, 'narrative': str, 'visual_instruction': str}
     """
+    scene_name = None   # None until the first "## Scene:" (the preamble is skipped)
+    content = []
     with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+        for line in f:
+            match = SCENE_HEADER.search(line)
+            if match is None:
+                if scene_name is not None:
+                    if not scene_name.strip() and line.strip() and not content:
+                        # "## Scene:" with the name on the following line
+                        scene_name = line.rstrip("\n")
+                    else:
+                        content.append(line)
+                continue
+            if scene_name is not None:
+                content.append(line[:match.start()])
+                yield _scene_from_chunk(scene_name, "".join(content))
+            scene_name = match.group(1)
+            content = []
+    if scene_name is not None:
+        yield _scene_from_chunk(scene_name, "".join(content))
 
-    # Split by "## Scene: "
-    # The regex looks for "## Scene:" followed by the name, then captures everything until the next "## Scene:" or end of file.
-    scene_chunks = re.split(r'## Scene:\s*(.+)', content)[1:] # Skip the preamble before the first scene
-    
-    scenes = []
+def parse_markdown(file_path):
+    """
+    Parses a markdown file into a list of scene dictionaries.
     
-    # re.split returns [name1, content1, name2, content2, ...]
-    for i in range(0, len(scene_chunks), 2):
-        scene_name = scene_chunks[i].strip()
-        scene_content = scene_chunks[i+1]
-        
-        # Extract Narrative and Visual using simple string searching or regex
-        # Assuming format: **Narrative:** ... **Visual:** ...
-        # But let's be robust to variations like **Narrative**: or just Narrative:
-        
-        narrative_match = re.search(r'\*\*Narrative:?\*\*\s*(.*?)(?=\*\*Visual|\Z)', scene_content, re.DOTALL | re.IGNORECASE)
-        visual_match = re.search(r'\*\*Visual:?\*\*\s*(.*?)(?=$)', scene_content, re.DOTALL | re.IGNORECASE)
-        
-        narrative = narrative_match.group(1).strip() if narrative_match else ""
-        visual_instruction = visual_match.group(1).strip() if visual_match else ""
-        
-        scenes.append({
-            'scene_name': scene_name,
-            'narrative': narrative,
-            'visual_instruction': visual_instruction
-        })
+    Args:
+        file_path (str): Path to the markdown file.
         
-    return scenes
+    Returns:
+        list: A list of dicts, e.g., [{'scene_name': 'Intro', 'narrative': '...', 'visual_instruction': '...'}]
+    """
+    return list(iter_scenes(file_path))
 
 if __name__ == "__main__":
     # Simple test
@@ -0,0 +1,232 @@
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+
+from generator import generate_scene_code
+from checker import check_code
+from renderer import render_code
+import speculation
+import tracing
+
+console = Console()
+
+def generate_stage(scene):
+    """
+    Generates code for a scene.
+
+    Returns:
+        tuple: (code, verdict) where verdict is (passed, feedback) if the
+        code was already checked (speculative candidates are), else None.
+    """
+    name = scene['scene_name']
+    console.print(f"\n[bold cyan]Generating code for scene: {name}...[/bold cyan]")
+    if speculation.candidates_for_scene() > 1:
+        # Several candidates at once; the first that validates and passes the check wins
+        with tracing.span("generate", scene=name, speculative=True):
+            code, passed, feedback = speculation.speculative_generate(scene)
+        return code, (passed, feedback)
+    with tracing.span("generate", scene=name):
+        return generate_scene_code(scene), None
+
+def check_stage(scene, code, verdict=None, previous=None):
+    """
+    Checks generated code and regenerates it once with the critic's feedback if it fails.
+
+    Args:
+        scene (dict): The scene the code was generated for.
+        code (str): The generated code.
+        verdict (tuple): (passed, feedback) if the code was already checked;
+            passed is None if the critic could not check it.
+        previous (dict): Previous-scene context for a regeneration (see generate_scene_code).
+
+    Returns:
+        str: The code to render.
+    """
+    name = scene['scene_name']
+    if verdict is None:
+        # Check code quality
+        console.print(f"[dim]Checking code quality for {name}...[/dim]")
+        with tracing.span("check", scene=name):
+            verdict = check_code(code, scene)
+    passed, feedback = verdict
+
+    if passed:
+        console.print(f"[dim]Quality Check Passed for {name}.[/dim]")
+        return code
+    if passed is None:
+        # Regenerating blindly would not help: render it as is
+        console.print(f"[yellow]Quality Check unavailable for {name}, rendering it unchecked ({feedback}).[/yellow]")
+        return code
+
+    console.print(f"[bold yellow]Quality Check Failed for {name}: {feedback}[/bold yellow]")
+    console.print(f"[bold yellow]Regenerating {name} with feedback...[/bold yellow]")
+    # Regenerate with the critic's feedback appended to the visual instruction.
+    # Work on a copy so concurrent scenes never see each other's feedback.
+    retry_scene = dict(scene)
+    retry_scene['visual_instruction'] += f"\n\nCRITICAL FEEDBACK FROM PREVIOUS ATTEMPT: {feedback}"
+    with tracing.span("regenerate", scene=name):
+        code = generate_scene_code(retry_scene, previous=previous)
+
+    console.print(f"[bold green]Regenerated code for {name}.[/bold green]")
+    return code
+
+def render_stage(scene, code, output_dir="output"):
+    """Renders checked code. Returns the video path, or None if rendering failed."""
+    with tracing.span("render", scene=scene['scene_name']):
+        return render_code(code, scene['scene_name'], output_dir=output_dir)
+
+def process_scene(scene):
+    """
+    Runs the full generate -> check -> render chain for a single scene.
+
+    Args:
+        scene (dict): {'scene_name': str, 'narrative': str, 'visual_instruction': str}
+
+    Returns:
+        str: Path to the rendered video, or None if the scene failed.
+    """
+    try:
+        code, verdict = generate_stage(scene)
+        code = check_stage(scene, code, verdict)
+        return render_stage(scene, code)
+
+    except Exception as e:
+        console.print(f"[bold red]Failed to process scene {scene['scene_name']}: {e}[/bold red]")
+        return None
+
+def run_pipeline(scenes, jobs=1, on_scene_done=None):
+    """
+    Processes all scenes, optionally several at a time.
+
+    LLM stages are network bound, so each scene runs on its own thread; the
+    manim subprocesses they launch are bounded separately by the renderer
+    (see renderer.set_max_renders).
+
+    Args:
+        scenes (list): Scene dicts as returned by parse_markdown.
+        jobs (int): Number of scenes to process concurrently.
+        on_scene_done (callable): Called as on_scene_done(index, video_path)
+            as soon as each scene finishes (video_path is None on failure),
+            from the thread that processed it.
+
+    Returns:
+        list: Rendered video paths, in the original scene order.
+    """
+    def process(index):
+        path = process_scene(scenes[index])
+        if on_scene_done:
+            try:
+                on_scene_done(index, path)
+            except Exception as e:
+                console.print(f"[yellow]Warning: progress callback failed for {scenes[index]['scene_name']}: {e}[/yellow]")
+        return path
+
+    if jobs <= 1:
+        results = [process(i) for i in range(len(scenes))]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            # map() yields results in input order regardless of completion order
+            results = list(pool.map(process, range(len(scenes))))
+
+    return [path for path in results if path]
+
+def run_sequence(scenes, on_scene_done=None, output_dir="output"):
+    """
+    Continuous mode: all scenes become sections of one Scene, rendered in one manim run.
+
+    Scenes are generated in order, each seeing the previous scene's code so
+    it can reuse its mobjects instead of rebuilding them. Scenes the sequence
+    cannot render are then rendered on their own.
+
+    Args:
+        scenes (list): Scene dicts as returned by parse_markdown.
+        on_scene_done (callable): Called as on_scene_done(index, video_path) for every scene.
+        output_dir (str): Directory for the scene videos.
+
+    Returns:
+        list: Rendered video paths, in the original scene order.
+    """
+    from sequence import bound_names, render_sequence
+
+    codes = [None] * len(scenes)
+    previous = None
+    for index, scene in enumerate(scenes):
+        name = scene['scene_name']
+        console.print(f"\n[bold cyan]Generating code for scene: {name}...[/bold cyan]")
+        try:
+            with tracing.span("generate", scene=name, continuous=True):
+                code = generate_scene_code(scene, previous=previous)
+            code = check_stage(scene, code, previous=previous)
+        except Exception as e:
+            console.print(f"[bold red]Failed to generate scene {name}: {e}[/bold red]")
+            continue
+        codes[index] = code
+        previous = {'scene_name': name, 'code': code, 'names': bound_names(code)}
+
+    generated = [index for index, code in enumerate(codes) if code]
+    paths = [None] * len(scenes)
+    if generated:
+        with tracing.span("render", scene="sequence", scenes=len(generated)):
+            rendered = render_sequence([scenes[i] for i in generated], [codes[i] for i in generated],
+                                       output_dir=output_dir)
+        for index, path in zip(generated, rendered):
+            paths[index] = path
+
+    for index in generated:
+        if paths[index] is None:
+            # Rendered alone it can no longer see the previous scene's objects; repair takes care of that
+            console.print(f"[bold yellow]Rendering {scenes[index]['scene_name']} on its own...[/bold yellow]")
+            try:
+                paths[index] = render_stage(scenes[index], codes[index], output_dir=output_dir)
+            except Exception as e:
+                console.print(f"[bold red]Failed to process scene {scenes[index]['scene_name']}: {e}[/bold red]")
+
+    if on_scene_done:
+        for index, path in enumerate(paths):
+            try:
+                on_scene_done(index, path)
+            except Exception as e:
+                console.print(f"[yellow]Warning: progress callback failed for {scenes[index]['scene_name']}: {e}[/yellow]")
+    return [path for path in paths if path]
+
+def merge_videos(video_files, output_merged="final_video.mp4"):
+    """
+    Concatenates the rendered scene videos with ffmpeg.
+
+    Args:
+        video_files (list): Video paths, in playback order.
+        output_merged (str): Path of the merged video.
+
+    Returns:
+        str: Absolute path of the merged video, or None if ffmpeg failed.
+    """
+    # Create a file list for ffmpeg. Unique per call: batch documents and
+    # concurrent runs may be merging in the same working directory
+    fd, list_file = tempfile.mkstemp(prefix="manimator-concat-", suffix=".txt")
+    with os.fdopen(fd, "w") as f:
+        for v in video_files:
+            # ffmpeg requires absolute paths or relative safe paths
+            abs_path = os.path.abspath(v).replace("'", "'\\''")
+            f.write(f"file '{abs_path}'\n")
+
+    # ffmpeg command to concat
+    cmd = [
+        "ffmpeg",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_file,
+        "-c", "copy",
+        "-y", # overwrite
+        output_merged
+    ]
+
+    try:
+        with tracing.span("merge", videos=len(video_files)):
+            subprocess.run(cmd, check=True, capture_output=True)
+        return os.path.abspath(output_merged)
+    except subprocess.CalledProcessError:
+        return None
+    finally:
+        os.remove(list_file)
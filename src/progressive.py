@@ -0,0 +1,184 @@
+import math
+import os
+import subprocess
+import threading
+from rich.console import Console
+
+from generator import estimate_duration
+
+PLAYLIST_NAME = "playlist.m3u8"
+
+console = Console()
+
+class ProgressivePlaylist:
+    """
+    An HLS playlist that grows as scenes finish rendering.
+
+    Each finished scene is remuxed (no re-encode) to an MPEG-TS segment. The
+    playlist is an EVENT playlist, which may only be appended to, so it lists
+    the longest finished prefix of the script: a scene that finishes early
+    shows up once every scene before it is done. A scene that fails is
+    replaced by a black placeholder of its estimated length, so playback
+    never stalls on it; if even that cannot be written, the scene is left
+    out. #EXT-X-ENDLIST is written by finish(). Progressive output never
+    raises: the normal merged video must not depend on it.
+
+    Every segment starts its own timeline, hence the DISCONTINUITY tags.
+    """
+
+    def __init__(self, output_dir, scenes, width, height, frame_rate):
+        self.output_dir = output_dir
+        self.scenes = scenes
+        self.size = f"{width}x{height}"
+        self.frame_rate = frame_rate
+        # index -> (segment filename, duration in seconds, is placeholder), or None if skipped
+        self.segments = {}
+        self.finished = False
+        # Target duration may not change in an EVENT playlist, so start from a generous estimate
+        longest = max([estimate_duration(scene.get('narrative', "")) for scene in scenes] or [10])
+        self.target_duration = math.ceil(longest * 1.5)
+        self._lock = threading.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+        for name in os.listdir(output_dir):
+            if name == PLAYLIST_NAME or name.endswith(".ts"):
+                os.remove(os.path.join(output_dir, name))
+        self._write()
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, PLAYLIST_NAME)
+
+    def scene_done(self, index, video_path):
+        """
+        Adds a scene's result. Safe to call from the scene threads.
+
+        Args:
+            index (int): Position of the scene in the script.
+            video_path (str): Rendered mp4, or None if the scene failed.
+        """
+        try:
+            entry = self._segment(index, video_path)
+        except Exception as e:
+            console.print(f"[yellow]Warning: progressive output skips scene {index + 1}: {e}[/yellow]")
+            entry = None
+        try:
+            with self._lock:
+                self.segments[index] = entry
+                self._write()
+        except OSError as e:
+            console.print(f"[yellow]Warning: could not update {self.playlist_path}: {e}[/yellow]")
+
+    def _segment(self, index, video_path):
+        """Writes the scene's segment (or placeholder). Returns its playlist entry, or None."""
+        if video_path:
+            segment = f"scene_{index:03d}.ts"
+            placeholder = not _remux(video_path, os.path.join(self.output_dir, segment))
+        else:
+            placeholder = True
+        if placeholder:
+            segment = f"gap_{index:03d}.ts"
+            seconds = estimate_duration(self.scenes[index].get('narrative', ""))
+            if not _black_clip(os.path.join(self.output_dir, segment), seconds, self.size, self.frame_rate):
+                console.print(f"[yellow]Warning: could not write a placeholder for scene {index + 1}, "
+                              "leaving it out of the progressive output.[/yellow]")
+                return None
+        return (segment, _duration(os.path.join(self.output_dir, segment)), placeholder)
+
+    def finish(self):
+        """Marks the playlist complete; scenes that never reported get placeholders."""
+        for index in range(len(self.scenes)):
+            if index not in self.segments:
+                self.scene_done(index, None)
+        try:
+            with self._lock:
+                self.finished = True
+                self._write()
+        except OSError as e:
+            console.print(f"[yellow]Warning: could not finish {self.playlist_path}: {e}[/yellow]")
+
+    def _write(self):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        entries = []
+        for index in range(len(self.scenes)):
+            if index not in self.segments:
+                break
+            if self.segments[index] is None:
+                continue
+            segment, duration, placeholder = self.segments[index]
+            if entries:
+                entries.append("#EXT-X-DISCONTINUITY")
+            title = self.scenes[index]['scene_name'] + (" (missing)" if placeholder else "")
+            entries.append(f"#EXTINF:{duration:.3f},{title}")
+            entries.append(segment)
+            # Players tolerate a late increase better than a segment longer than announced
+            self.target_duration = max(self.target_duration, math.ceil(duration))
+        lines.append(f"#EXT-X-TARGETDURATION:{self.target_duration}")
+        lines.append("#EXT-X-MEDIA-SEQUENCE:0")
+        lines.extend(entries)
+        if self.finished:
+            lines.append("#EXT-X-ENDLIST")
+
+        tmp_path = f"{self.playlist_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        # Readers polling the playlist never see a half-written file
+        os.replace(tmp_path, self.playlist_path)
+
+def _remux(video_path, segment_path):
+    """Copies an mp4's streams into an MPEG-TS segment. Returns False if ffmpeg failed."""
+    cmd = [
+        "ffmpeg",
+        "-i", video_path,
+        "-c", "copy",
+        "-bsf:v", "h264_mp4toannexb",
+        "-f", "mpegts",
+        "-y",
+        segment_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        return True
+    except (subprocess.CalledProcessError, OSError):
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+        return False
+
+def _black_clip(segment_path, seconds, size, frame_rate):
+    """Encodes a black placeholder segment. Returns False if ffmpeg failed."""
+    cmd = [
+        "ffmpeg",
+        "-f", "lavfi",
+        "-i", f"color=c=black:s={size}:r={frame_rate}:d={seconds:.3f}",
+        "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
+        "-f", "mpegts",
+        "-y",
+        segment_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        return True
+    except (subprocess.CalledProcessError, OSError):
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+        return False
+
+def _duration(path):
+    """Duration of a media file in seconds (0 if it cannot be probed)."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path,
+    ]
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return float(result.stdout.strip())
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return 0.0
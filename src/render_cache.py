@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from cache import CACHE_ROOT, cache_enabled, cache_key
+
+# Rendered scenes are stored as <key>.mp4 next to a manifest describing them.
+RENDER_CACHE_DIR = os.path.join(CACHE_ROOT, "renders")
+MANIFEST_PATH = os.path.join(RENDER_CACHE_DIR, "manifest.json")
+LOCK_PATH = os.path.join(RENDER_CACHE_DIR, "manifest.lock")
+
+# Default budget for garbage collection. Override with MANIMATOR_RENDER_CACHE_MB.
+MAX_BYTES = int(os.getenv("MANIMATOR_RENDER_CACHE_MB", "2048")) * 1024 * 1024
+
+# gc never deletes unmanifested videos younger than this: another process may
+# have moved one into place and not yet recorded it in the manifest
+GC_GRACE_SECONDS = 600
+
+_lock = threading.Lock()
+
+@contextmanager
+def _manifest_lock():
+    """
+    Serialises manifest read-modify-write cycles between threads and processes
+    (concurrent runs and batch workers share the cache).
+    """
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        with open(LOCK_PATH, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@lru_cache(maxsize=1)
+def manim_version():
+    """Returns the installed manim version (part of every render key)."""
+    try:
+        from importlib.metadata import version
+        return version("manim")
+    except Exception:
+        return "unknown"
+
+def script_key(full_script, quality_flags):
+    """
+    Builds the render cache key for a complete GeneratedScene script.
+    
+    Args:
+        full_script (str): The final script handed to manim (template included).
+        quality_flags (list): Manim CLI flags that affect the output (e.g. ["-ql"]).
+        
+    Returns:
+        str: Hex digest identifying the rendered output.
+    """
+    return cache_key(full_script, manim_version(), list(quality_flags))
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(manifest):
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def _entry_is_valid(entry):
+    try:
+        return os.path.getsize(entry["path"]) == entry["size"]
+    except (OSError, KeyError):
+        return False
+
+def lookup(key):
+    """
+    Returns the cached video for key if it still exists with the recorded size.
+    
+    Returns:
+        str: Path to the cached mp4, or None on a miss.
+    """
+    if not cache_enabled():
+        return None
+    with _manifest_lock():
+        manifest = _load_manifest()
+        entry = manifest.get(key)
+        if entry is None:
+            return None
+        if not _entry_is_valid(entry):
+            # Stale entry (file deleted or truncated) - forget it
+            del manifest[key]
+            _save_manifest(manifest)
+            return None
+        entry["last_used"] = time.time()
+        _save_manifest(manifest)
+        return entry["path"]
+
+def store(key, video_path, scene_name):
+    """
+    Adds a freshly rendered video to the cache.
+    
+    The video is hard-linked (or copied) to a content-addressed location so
+    later renders that reuse the same temp_* module name cannot overwrite it.
+    
+    Returns:
+        str: Path to the cached copy, or video_path if caching is disabled.
+    """
+    if not cache_enabled():
+        return video_path
+
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    cached_path = os.path.join(RENDER_CACHE_DIR, f"{key}.mp4")
+    tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(video_path, tmp_path)
+    except OSError:
+        shutil.copy2(video_path, tmp_path)
+    os.replace(tmp_path, cached_path)
+
+    now = time.time()
+    with _manifest_lock():
+        manifest = _load_manifest()
+        manifest[key] = {
+            "path": cached_path,
+            "size": os.path.getsize(cached_path),
+            "scene_name": scene_name,
+            "manim_version": manim_version(),
+            "created": now,
+            "last_used": now,
+        }
+        _save_manifest(manifest)
+    return cached_path
+
+def gc(max_bytes=MAX_BYTES):
+    """
+    Garbage-collects the render cache.
+    
+    Drops manifest entries whose file is missing or the wrong size, deletes
+    mp4 files the manifest does not know about (once they are older than
+    GC_GRACE_SECONDS), then evicts least recently used entries until the
+    cache fits in max_bytes.
+    
+    Returns:
+        int: Number of files/entries removed.
+    """
+    removed = 0
+    with _manifest_lock():
+        manifest = _load_manifest()
+        for key in [k for k, entry in manifest.items() if not _entry_is_valid(entry)]:
+            del manifest[key]
+            removed += 1
+
+        known = {os.path.basename(entry["path"]) for entry in manifest.values()}
+        if os.path.isdir(RENDER_CACHE_DIR):
+            cutoff = time.time() - GC_GRACE_SECONDS
+            for filename in os.listdir(RENDER_CACHE_DIR):
+                path = os.path.join(RENDER_CACHE_DIR, filename)
+                if not filename.endswith(".mp4") or filename in known:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+
+        total = sum(entry["size"] for entry in manifest.values())
+        for key, entry in sorted(manifest.items(), key=lambda item: item[1]["last_used"]):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+            total -= entry["size"]
+            del manifest[key]
+            removed += 1
+
+        _save_manifest(manifest)
+    return removed
+
+def clear():
+    """Invalidates the whole render cache."""
+    with _manifest_lock():
+        shutil.rmtree(RENDER_CACHE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    # Simple maintenance entry point: python render_cache.py [gc|clear]
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "gc"
+    if command == "clear":
+        clear()
+    else:
+        print(f"Removed {gc()} entries.")
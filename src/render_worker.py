@@ -0,0 +1,199 @@
+import linecache
+import multiprocessing
+import os
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import asset_cache
+
+# Pixel size / frame rate for each manim quality name (mirrors manim.constants.QUALITIES).
+# tempconfig ignores the derived "quality" key, so jobs must set these directly.
+QUALITY_CONFIG = {
+    "low_quality": {"pixel_height": 480, "pixel_width": 854, "frame_rate": 15},
+    "medium_quality": {"pixel_height": 720, "pixel_width": 1280, "frame_rate": 30},
+    "high_quality": {"pixel_height": 1080, "pixel_width": 1920, "frame_rate": 60},
+    "production_quality": {"pixel_height": 1440, "pixel_width": 2560, "frame_rate": 60},
+    "fourk_quality": {"pixel_height": 2160, "pixel_width": 3840, "frame_rate": 60},
+}
+
+_pool = None
+_pool_size = 1
+_pool_lock = threading.Lock()
+
+# Shared Tex/text asset cache of the job being rendered (None: caching off)
+_asset_cache_dir = None
+
+def _init_worker():
+    """Runs once per worker process: pay the manim/numpy/cairo import cost up front."""
+    import manim  # noqa: F401
+    _install_asset_lookup()
+
+def _pull_asset(kind, directory, name):
+    if _asset_cache_dir is not None:
+        asset_cache.fetch(kind, str(directory), name, _asset_cache_dir)
+
+def _install_asset_lookup():
+    """
+    Makes manim look in the shared asset cache before compiling a Tex or Text SVG.
+
+    Manim names those files by content hash and skips compiling when
+    <hash>.svg exists, so the hooks link the cached file in right after the
+    name is known. Manim versions without these functions are left alone
+    (jobs then compile their assets).
+    """
+    try:
+        from manim import config
+        from manim.mobject.text import text_mobject
+        from manim.utils import tex_file_writing
+    except ImportError:
+        return
+
+    generate_tex_file = getattr(tex_file_writing, "generate_tex_file", None)
+    if generate_tex_file is not None:
+        def generate_tex_file_from_cache(*args, **kwargs):
+            tex_file = generate_tex_file(*args, **kwargs)
+            stem, _ = os.path.splitext(os.path.basename(str(tex_file)))
+            _pull_asset("Tex", os.path.dirname(str(tex_file)), stem)
+            return tex_file
+        tex_file_writing.generate_tex_file = generate_tex_file_from_cache
+
+    for cls in (getattr(text_mobject, "Text", None), getattr(text_mobject, "MarkupText", None)):
+        text2hash = cls.__dict__.get("_text2hash") if cls is not None else None
+        if text2hash is None:
+            continue
+        def text2hash_from_cache(self, *args, _text2hash=text2hash, **kwargs):
+            name = _text2hash(self, *args, **kwargs)
+            _pull_asset("texts", config.get_dir("text_dir"), name)
+            return name
+        cls._text2hash = text2hash_from_cache
+
+def _render_job(job):
+    """
+    Renders one scene script inside a warm worker process.
+
+    Args:
+        job (dict): {'script': str, 'script_path': str, 'scene_class': str, 'config': dict,
+                     'seed': int|None, 'record_sections': bool, 'asset_cache_dir': str|None}
+
+    Returns:
+        dict: {'ok': bool, 'path': str|None, 'duration': float, 'cpu_time': float,
+               'exception': str|None, 'traceback': str|None}; with record_sections also
+               'sections' ([num_plays, time] at every next_section() call), 'num_plays' and 'time'.
+    """
+    global _asset_cache_dir
+    import numpy as np
+    from manim import tempconfig
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = {'ok': False, 'path': None, 'exception': None, 'traceback': None}
+
+    # Make tracebacks show source lines even though the script never touches disk
+    script = job['script']
+    linecache.cache[job['script_path']] = (len(script), None, script.splitlines(True), job['script_path'])
+
+    _asset_cache_dir = job.get('asset_cache_dir')
+    if job.get('seed') is not None:
+        # Renders of parts of one scene must all see the same random numbers
+        random.seed(job['seed'])
+        np.random.seed(job['seed'])
+
+    try:
+        with tempconfig(job['config']):
+            namespace = {'__name__': '__manimator_job__'}
+            exec(compile(script, job['script_path'], 'exec'), namespace)
+            scene = namespace[job['scene_class']]()
+            if job.get('record_sections'):
+                _record_sections(scene, result)
+            scene.render()
+            if job.get('record_sections'):
+                result['num_plays'] = scene.renderer.num_plays
+                result['time'] = scene.renderer.time
+            # Validation runs (save_last_frame / dry_run) write no movie
+            movie_file_path = getattr(scene.renderer.file_writer, "movie_file_path", None)
+            result['path'] = str(movie_file_path) if movie_file_path else None
+        result['ok'] = True
+    except Exception as e:
+        result['exception'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    finally:
+        linecache.cache.pop(job['script_path'], None)
+
+    result['duration'] = time.perf_counter() - start
+    result['cpu_time'] = time.process_time() - cpu_start
+    return result
+
+def _record_sections(scene, result):
+    """Makes the scene note where each next_section() starts: [animations played so far, scene time]."""
+    result['sections'] = []
+    next_section = scene.next_section
+
+    def recording_next_section(*args, **kwargs):
+        result['sections'].append([scene.renderer.num_plays, scene.renderer.time])
+        return next_section(*args, **kwargs)
+
+    scene.next_section = recording_next_section
+
+def set_pool_size(n):
+    """Sets the number of warm workers used by the next pool that gets started."""
+    global _pool_size
+    _pool_size = max(1, n)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a parent that is running scene threads
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+def shutdown():
+    """Stops the warm workers (a new pool is started lazily on the next render)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+def render(script, script_path, config, scene_class="GeneratedScene", seed=None, record_sections=False,
+           asset_cache_dir=None):
+    """
+    Renders a script on the warm worker pool, blocking until the job finishes.
+
+    Args:
+        script (str): Complete manim script defining scene_class.
+        script_path (str): Filename the script pretends to live at; its stem
+            becomes manim's module_name (and so the videos/ subdirectory).
+        config (dict): Per-job manim config, applied with tempconfig.
+        scene_class (str): Name of the Scene subclass to render.
+        seed (int): Seeds random and numpy.random before the script runs.
+        record_sections (bool): Report where the scene's sections start.
+        asset_cache_dir (str): Shared Tex/text cache to look assets up in (see asset_cache.fetch).
+
+    Returns:
+        dict: The structured job result (see _render_job). If a worker dies
+        (or manim cannot be imported) the pool is torn down and
+        BrokenProcessPool is raised so the caller can fall back.
+    """
+    job = {
+        'script': script,
+        'script_path': script_path,
+        'scene_class': scene_class,
+        'config': config,
+        'seed': seed,
+        'record_sections': record_sections,
+        'asset_cache_dir': asset_cache_dir,
+    }
+    try:
+        return _get_pool().submit(_render_job, job).result()
+    except BrokenProcessPool:
+        shutdown()
+        raise
@@ -1,11 +1,135 @@
+import json
 import os
+import re
+import shutil
 import subprocess
-import sys
-import textwrap
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from rich.console import Console
 
+import asset_cache
+import render_cache
+import render_worker
+import tracing
+from repair_memo import RepairSession
+from repairer import condense_error
+from validator import normalize_code, validate_code, format_issues
+
 console = Console()
 
+# --quality presets: manim CLI flag and the matching manim quality name (for warm workers)
+QUALITY_PRESETS = {
+    "low": ("-ql", "low_quality"),
+    "medium": ("-qm", "medium_quality"),
+    "high": ("-qh", "high_quality"),
+    "production": ("-qp", "production_quality"),
+    "4k": ("-qk", "fourk_quality"),
+}
+_quality = os.getenv("MANIMATOR_QUALITY", "low")
+
+# --validate-mode: how repair iterations check that the code runs before the one final render.
+# "skip" renders only the last frame (animations are skipped), "dry-run" plays every frame
+# but writes nothing, "full" renders every attempt at final quality.
+VALIDATE_MODES = {
+    "skip": {"flags": ["-s"], "config": {"save_last_frame": True}},
+    "dry-run": {"flags": ["--dry_run"], "config": {"dry_run": True}},
+    "full": None,
+}
+# Validation always runs at the cheapest quality
+VALIDATE_QUALITY = "low"
+_validate_mode = os.getenv("MANIMATOR_VALIDATE_MODE", "skip")
+
+# "workers": render on warm manim processes (render_worker), "cli": one manim subprocess per attempt
+_backend = os.getenv("MANIMATOR_RENDER_BACKEND", "workers")
+
+# Parent of the per-job workdirs. tmpfs keeps manim's scratch I/O (partial movies,
+# LaTeX runs) in memory; override with MANIMATOR_WORK_DIR (e.g. for long 4k renders).
+WORK_ROOT = os.getenv("MANIMATOR_WORK_DIR") or ("/dev/shm" if os.access("/dev/shm", os.W_OK) else None)
+
+# Bounds how many manim processes may run at once when scenes are processed
+# concurrently. Rendering is CPU bound, so this defaults to one per core.
+_render_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+_max_renders = os.cpu_count() or 1
+
+# --parallel-sections: split a scene's final render at its next_section() calls into up
+# to this many parts (0 or 1 = one process per scene). Parts queue on the warm pool like
+# any render, so at most --render-jobs of them run at once.
+_section_parts = int(os.getenv("MANIMATOR_PARALLEL_SECTIONS", "0"))
+# random / numpy.random seed of every part of a split scene (and of the run that plans
+# the split), so each part rebuilds exactly the state the previous one ended with
+SECTION_SEED = 0
+
+def set_max_renders(n):
+    """
+    Sets the maximum number of manim renders allowed to run concurrently.
+    
+    Args:
+        n (int): Number of render slots (at least 1).
+    """
+    global _render_slots, _max_renders
+    _render_slots = threading.BoundedSemaphore(max(1, n))
+    _max_renders = max(1, n)
+    render_worker.set_pool_size(_max_renders)
+
+def set_parallel_sections(n):
+    """
+    Splits final renders into up to n parts rendered concurrently (0 or 1 disables it).
+    
+    The parts share the render slots (set_max_renders) with every other
+    render; a scene is never split into more parts than there are slots.
+    
+    Args:
+        n (int): Maximum number of parts per scene.
+    """
+    global _section_parts
+    _section_parts = max(0, n)
+
+def set_quality(name):
+    """
+    Selects the quality preset of the final render.
+    
+    Args:
+        name (str): One of QUALITY_PRESETS ("low", "medium", "high", "production", "4k").
+    """
+    global _quality
+    if name not in QUALITY_PRESETS:
+        raise ValueError(f"Unknown quality preset: {name}")
+    _quality = name
+
+def set_validate_mode(name):
+    """
+    Selects how repair iterations are validated before the final render.
+    
+    Args:
+        name (str): One of VALIDATE_MODES ("skip", "dry-run", "full").
+    """
+    global _validate_mode
+    if name not in VALIDATE_MODES:
+        raise ValueError(f"Unknown validate mode: {name}")
+    _validate_mode = name
+
+def quality_settings():
+    """Pixel size and frame rate of the final render: {'pixel_height', 'pixel_width', 'frame_rate'}."""
+    return render_worker.QUALITY_CONFIG[QUALITY_PRESETS[_quality][1]]
+
+def quality_flags():
+    """Manim CLI flags of the final render (part of the render cache key)."""
+    return [QUALITY_PRESETS[_quality][0]]
+
+def set_backend(name):
+    """
+    Selects how scenes are rendered.
+    
+    Args:
+        name (str): "workers" (warm persistent manim processes) or "cli" (manim subprocess per attempt).
+    """
+    global _backend
+    _backend = name
+
 TEMPLATE = """
 from manim import *
 
@@ -13,133 +137,478 @@ class GeneratedScene(Scene):
     def construct(self):
         {code}
 """
+# Script line of the first construct() line, to map traceback lines back to the generated code
+BODY_FIRST_LINE = TEMPLATE[:TEMPLATE.index("{code}")].count("\n") + 1
 
-def fix_indentation(code):
+def wrap_code(code):
+    """Wraps a construct body in TEMPLATE, giving the complete script handed to manim."""
+    # Indent the code to fit inside the class
+    indented_code = "\n        ".join(code.splitlines())
+    return TEMPLATE.format(code=indented_code)
+
+def expected_video_path(output_dir, temp_file, output_filename, quality):
     """
-    Heuristic to fix indentation errors from LLM output.
-    Rules:
-    1. If previous line ends with :, (, [, {, ,, \, keep indentation.
-    2. Otherwise, strip indentation (force flat).
+    Where manim writes a scene's movie, derived the way manim's config does it.
+    
+    Manim's default video_dir is {media_dir}/videos/{module_name}/{quality}, where
+    {quality} is "<pixel_height>p<frame_rate>" (e.g. 480p15 for -ql).
     """
-    lines = code.splitlines()
-    fixed_lines = []
+    settings = render_worker.QUALITY_CONFIG[QUALITY_PRESETS[quality][1]]
+    module_name = os.path.splitext(os.path.basename(temp_file))[0]
+    quality_dir = f"{settings['pixel_height']}p{settings['frame_rate']:g}"
+    return os.path.join(output_dir, "videos", module_name, quality_dir, output_filename)
+
+def job_paths(workdir):
+    """Script, media dir and Tex/text asset dirs of a job workdir."""
+    return {
+        'script': os.path.join(workdir, "scene.py"),
+        'media': os.path.join(workdir, "media"),
+        'assets': {kind: os.path.join(workdir, kind) for kind in asset_cache.KINDS},
+    }
+
+@contextmanager
+def job_workdir(scene_name):
+    """
+    A private scratch directory for one render_code call, removed afterwards.
     
-    for line in lines:
-        stripped = line.strip()
-        if not stripped:
-            fixed_lines.append("")
-            continue
+    Everything manim writes (script, partial movies, Tex/text SVGs) stays in
+    it, so concurrent jobs - even with the same scene name - never collide.
+    Known formulas and texts are not compiled again: warm workers link them
+    from the shared asset cache as manim asks for them, while for the CLI
+    the whole cache is seeded into it up front.
+    """
+    prefix = "manimator-" + re.sub(r"[^A-Za-z0-9]+", "_", scene_name)[:40] + "-"
+    workdir = tempfile.mkdtemp(prefix=prefix, dir=WORK_ROOT)
+    try:
+        assets = job_paths(workdir)['assets']
+        if _backend == "workers":
+            for directory in assets.values():
+                os.makedirs(directory, exist_ok=True)
+        else:
+            asset_cache.seed(assets)
+        yield workdir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _write_cli_config(workdir):
+    """Writes a manim.cfg pointing the CLI at the job's Tex/text dirs. Returns its path."""
+    paths = job_paths(workdir)
+    cfg_path = os.path.join(workdir, "manim.cfg")
+    with open(cfg_path, "w") as f:
+        f.write("[CLI]\n")
+        # configparser interpolates %, so escape it in paths
+        f.write(f"tex_dir = {paths['assets']['Tex'].replace('%', '%%')}\n")
+        f.write(f"text_dir = {paths['assets']['texts'].replace('%', '%%')}\n")
+    return cfg_path
+
+def _render_cli(full_script, workdir, output_filename, quality, validate=None, sections=False):
+    """
+    Renders a script with a fresh manim CLI subprocess.
+    
+    Args:
+        workdir (str): The job's private directory (see job_workdir).
+        quality (str): Quality preset name.
+        validate (dict): A VALIDATE_MODES entry for a cheap validation run, or None for a real render.
+        sections (bool): Save a video per next_section() as well (--save_sections).
+    
+    Returns:
+        dict: {'ok': bool, 'path': str|None, 'duration': float, 'error': str|None}
+    """
+    paths = job_paths(workdir)
+    with open(paths['script'], "w") as f:
+        f.write(full_script)
         
-        # Find previous non-empty line
-        prev_line = ""
-        for p in reversed(fixed_lines):
-            if p.strip():
-                prev_line = p.strip()
-                break
+    # Run Manim
+    # -c = job config (private Tex/text dirs)
+    # --media_dir = specify output directory
+    # -o = specify output filename explicitly to make it predictable
+    cmd = [
+        "manim",
+        QUALITY_PRESETS[quality][0],
+        *(validate["flags"] if validate else []),
+        *(["--save_sections"] if sections else []),
+        "-c", _write_cli_config(workdir),
+        "--media_dir", paths['media'],
+        "-o", output_filename,
+        paths['script'],
+        "GeneratedScene"
+    ]
+    
+    start = time.perf_counter()
+    try:
+        with _render_slots:
+            subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=workdir
+            )
+    except subprocess.CalledProcessError as e:
+        return {'ok': False, 'path': None, 'duration': time.perf_counter() - start, 'error': e.stderr}
+    duration = time.perf_counter() - start
+    
+    path = None
+    if not validate:
+        path = expected_video_path(paths['media'], paths['script'], output_filename, quality)
+        if not os.path.exists(path):
+            path = None
+    return {'ok': True, 'path': path, 'duration': duration, 'error': None}
+
+def _render_warm(full_script, workdir, output_filename, quality, validate=None, sections=False,
+                 record=False, animations=None):
+    """
+    Renders a script on a warm worker through manim's Python API.
+    
+    Args:
+        record (bool): Also report where the scene's sections start (see split_animations).
+        animations (tuple): (first, last) animation numbers to render, last None for
+            "to the end"; earlier animations run without rendering (manim's -n).
+    
+    Returns:
+        dict: {'ok': bool, 'path': str|None, 'duration': float, 'cpu_time': float, 'error': str|None},
+        plus 'layout' ({'sections', 'num_plays', 'time'}) when recording.
+    """
+    paths = job_paths(workdir)
+    config = {
+        "media_dir": paths['media'],
+        "tex_dir": paths['assets']['Tex'],
+        "text_dir": paths['assets']['texts'],
+        # The (never written) script path sets module_name, keeping manim's videos/ layout
+        "input_file": paths['script'],
+        "output_file": output_filename,
+        "verbosity": "WARNING",
+        "progress_bar": "none",
+        **render_worker.QUALITY_CONFIG[QUALITY_PRESETS[quality][1]],
+        **(validate["config"] if validate else {}),
+        **({"save_sections": True} if sections else {}),
+    }
+    if animations:
+        first, last = animations
+        config["from_animation_number"] = first
+        if last is not None:
+            config["upto_animation_number"] = last
+    seed = SECTION_SEED if record or animations else None
+    result = render_worker.render(full_script, paths['script'], config, seed=seed, record_sections=record,
+                                  asset_cache_dir=asset_cache.lookup_dir())
+    layout = None
+    if record and result['ok']:
+        layout = {key: result[key] for key in ('sections', 'num_plays', 'time')}
+    return {
+        'ok': result['ok'],
+        # The worker reports manim's own movie_file_path
+        'path': None if validate else result['path'],
+        'duration': result['duration'],
+        'cpu_time': result['cpu_time'],
+        'error': result['traceback'],
+        'layout': layout,
+    }
+
+def _render_attempt(full_script, workdir, output_filename, quality, validate=None, sections=False, record=False):
+    """Renders with the selected backend, falling back to the CLI if the worker pool is unusable."""
+    if _backend == "workers":
+        try:
+            return _render_warm(full_script, workdir, output_filename, quality, validate, sections, record)
+        except BrokenProcessPool:
+            console.print("[yellow]Warning: warm render workers unavailable, falling back to manim CLI.[/yellow]")
+            set_backend("cli")
+    return _render_cli(full_script, workdir, output_filename, quality, validate, sections)
+
+def keep_render(key, video_path, output_path, scene_name):
+    """
+    Moves a finished render out of the job workdir: into the render cache and to output_path.
+    
+    Returns:
+        str: The cached copy, or when caching is off a copy next to output_path
+        named after the key (<Scene>.<key>.mp4).
+    """
+    # Cache first: the content-addressed copy cannot be overwritten by a
+    # concurrent run that renders a scene of the same name into output_dir
+    cached_path = render_cache.store(key, video_path, scene_name)
+    publish_video(video_path, output_path)
+    # (store hands video_path itself back when caching is off)
+    if cached_path != video_path:
+        return cached_path
+    # output_path itself may be replaced any moment by a same-named scene
+    stem, ext = os.path.splitext(output_path)
+    return publish_video(video_path, f"{stem}.{key[:16]}{ext}")
+
+def render_tiers(full_script, workdir, output_filename, label, attempt, max_attempts, sections=False):
+    """
+    One render attempt: the cheap validation run (unless the validate mode is
+    "full"), then - if that passed - the render at final quality.
+    
+    Args:
+        full_script (str): Complete script (see wrap_code).
+        workdir (str): The job's private directory (see job_workdir).
+        output_filename (str): Movie file name.
+        label (str): Scene name shown in progress output and traces.
+        attempt (int): 0-based attempt number, max_attempts the total allowed.
+        sections (bool): Also save one video per next_section() of the final render.
+    
+    Returns:
+        dict: The result of the last run (see _render_cli); with sections, its
+        'sections' lists {'name', 'path', 'duration'} in playback order.
+    """
+    validate = VALIDATE_MODES[_validate_mode]
+    # Section videos come from one continuous render, so those scenes are never split
+    parts = min(_section_parts, _max_renders)
+    split = parts > 1 and _backend == "workers" and not sections
+    result = None
+    if validate:
+        console.print(f"[bold blue]Validating scene: {label} (Attempt {attempt+1}/{max_attempts}, {_validate_mode})...[/bold blue]")
+        with tracing.span("render attempt", scene=label, attempt=attempt + 1, tier=_validate_mode):
+            # The validation run doubles as the planning run of a split render
+            result = _render_attempt(full_script, workdir, output_filename, VALIDATE_QUALITY, validate, record=split)
+            tracing.add(cpu_time=result.get('cpu_time'))
+        if result['ok']:
+            console.print(f"[dim]{label} runs ({result['duration']:.1f}s).[/dim]")
+            asset_cache.publish(job_paths(workdir)['assets'])
+    
+    if result is None or result['ok']:
+        layout = result.get('layout') if result else None
+        if split and result is None:
+            # validate mode "full": plan the split with a skipping run of its own
+            with tracing.span("render attempt", scene=label, attempt=attempt + 1, tier="plan"):
+                planned = _render_attempt(full_script, workdir, output_filename, VALIDATE_QUALITY,
+                                          VALIDATE_MODES["skip"], record=True)
+                tracing.add(cpu_time=planned.get('cpu_time'))
+            layout = planned.get('layout')
+        ranges = split_animations(layout, parts) if split and layout else []
         
-        # Check if we should preserve indentation
-        if prev_line and (prev_line.endswith(":") or 
-                          prev_line.endswith("(") or 
-                          prev_line.endswith("[") or 
-                          prev_line.endswith("{") or 
-                          prev_line.endswith(",") or 
-                          prev_line.endswith("\\")):
-            fixed_lines.append(line)
-        else:
-            fixed_lines.append(stripped)
-            
-    return "\n".join(fixed_lines)
+        console.print(f"[bold blue]Rendering scene: {label} at {_quality} quality (Attempt {attempt+1}/{max_attempts})...[/bold blue]")
+        result = None
+        if len(ranges) > 1:
+            with tracing.span("render attempt", scene=label, attempt=attempt + 1, tier=_quality, parts=len(ranges)):
+                result = render_parts(full_script, workdir, output_filename, label, ranges)
+                if result:
+                    tracing.add(cpu_time=result.get('cpu_time'))
+        if result is None:
+            with tracing.span("render attempt", scene=label, attempt=attempt + 1, tier=_quality):
+                result = _render_attempt(full_script, workdir, output_filename, _quality, sections=sections)
+                tracing.add(cpu_time=result.get('cpu_time'))
+        if result['ok']:
+            asset_cache.publish(job_paths(workdir)['assets'])
+            if sections:
+                result['sections'] = _read_sections(result['path'])
+    return result
+
+def split_animations(layout, parts):
+    """
+    Splits a scene into up to `parts` runs of whole sections with about equal playing time.
+    
+    Args:
+        layout (dict): From a recording run: 'sections' ([animations played, scene time]
+            at each next_section() call), 'num_plays' and 'time' (the totals).
+        parts (int): Maximum number of ranges.
+    
+    Returns:
+        list: (first, last) animation numbers per range, last None for the final
+        range; fewer than two ranges when the scene is not worth splitting.
+    """
+    total_plays, total_time = layout['num_plays'], layout['time']
+    # A range must end at animation 1 or later (manim reads upto_animation_number 0 as "no limit")
+    starts = {}
+    for plays, at in layout['sections']:
+        if 2 <= plays < total_plays:
+            starts.setdefault(plays, at)
+    if not starts or total_time <= 0:
+        return []
+    cuts = []
+    for k in range(1, parts):
+        target = total_time * k / parts
+        plays = min(starts, key=lambda p: abs(starts[p] - target))
+        if not cuts or plays > cuts[-1]:
+            cuts.append(plays)
+    bounds = [0] + cuts
+    return [(first, bounds[i + 1] - 1 if i + 1 < len(bounds) else None) for i, first in enumerate(bounds)]
+
+def render_parts(full_script, workdir, output_filename, label, ranges):
+    """
+    Renders animation ranges of one scene concurrently on warm workers, then joins them.
+    
+    Every part runs the whole construct() with the same random seed, skipping
+    (not drawing) the animations before its range, so it starts from exactly
+    the state the previous part ended in. Parts get their own media dirs,
+    seeded with the job's already compiled Tex/text assets. The clips share
+    their encoding and are joined without re-encoding.
+    
+    Args:
+        ranges (list): (first, last) animation numbers per part (see split_animations).
+    
+    Returns:
+        dict: Like _render_cli's result, or None if any part or the join failed
+        (the caller then renders the scene in one process).
+    """
+    stem, ext = os.path.splitext(output_filename)
+    part_dirs = [os.path.join(workdir, f"part{i:03d}") for i in range(len(ranges))]
+    for part_dir in part_dirs:
+        asset_cache.seed(job_paths(part_dir)['assets'], sources=job_paths(workdir)['assets'])
+
+    def render_part(i):
+        return _render_warm(full_script, part_dirs[i], f"{stem}_part{i:03d}{ext}", _quality, animations=ranges[i])
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="section-part") as executor:
+            results = list(executor.map(render_part, range(len(ranges))))
+    except BrokenProcessPool:
+        results = []
+    failed = [i for i, result in enumerate(results) if not result['ok'] or not result['path']]
+    if not results or failed:
+        console.print(f"[yellow]Warning: split render of {label} failed, rendering it in one process.[/yellow]")
+        return None
+    
+    path = os.path.join(workdir, "media", output_filename)
+    if not concat_videos([result['path'] for result in results], path):
+        console.print(f"[yellow]Warning: could not join the parts of {label}, rendering it in one process.[/yellow]")
+        return None
+    console.print(f"[dim]{label}: rendered {len(ranges)} parts in parallel.[/dim]")
+    return {
+        'ok': True,
+        'path': path,
+        'duration': time.perf_counter() - start,
+        'cpu_time': sum(result.get('cpu_time') or 0.0 for result in results),
+        'error': None,
+    }
+
+def concat_videos(paths, output_path):
+    """
+    Joins identically encoded clips end to end without re-encoding (ffmpeg concat demuxer).
+    
+    Returns:
+        bool: Whether output_path was written.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+           "-i", list_path, "-c", "copy", output_path]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    finally:
+        os.remove(list_path)
+    return os.path.exists(output_path)
+
+def _read_sections(video_path):
+    """Section videos of a render with save_sections, from manim's index next to them."""
+    if not video_path:
+        return []
+    sections_dir = os.path.join(os.path.dirname(video_path), "sections")
+    index_path = os.path.join(sections_dir, os.path.splitext(os.path.basename(video_path))[0] + ".json")
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [{
+        'name': section['name'],
+        'path': os.path.join(sections_dir, section['video']),
+        'duration': float(section.get('duration') or 0),
+    } for section in index if section.get('video')]
+
+def publish_video(video_path, target):
+    """Moves a finished render out of the job workdir; the rename makes it appear atomically."""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(video_path, tmp_path)
+    except OSError:
+        shutil.copyfile(video_path, tmp_path)  # the workdir is on another filesystem (tmpfs)
+    os.replace(tmp_path, target)
+    return target
 
 def render_code(python_code, scene_name, output_dir="output"):
     """
     Wraps the generated code in a Scene class and renders it using Manim.
     
+    Unless the validate mode is "full", each attempt first runs a cheap
+    validation pass (see VALIDATE_MODES); failures there are repaired without
+    ever paying for a full-quality render, which happens once per scene.
+    
     Args:
         python_code (str): The code inside construct(self).
         scene_name (str): Name of the scene (used for file naming).
-        output_dir (str): Directory for output.
+        output_dir (str): Directory the finished video is moved to.
+    
+    Returns:
+        str: Path to the rendered video (in the render cache when it is enabled), or None.
     """
-    # Fix indentation using heuristic
-    # First dedent to handle the case where the whole block is indented
-    dedented_code = textwrap.dedent(python_code)
-    fixed_code = fix_indentation(dedented_code)
+    # manim runs in a private workdir; only the final video leaves it
+    with job_workdir(scene_name) as workdir:
+        return _render_in_workdir(python_code, scene_name, output_dir, workdir)
+
+def _render_in_workdir(python_code, scene_name, output_dir, workdir):
+    """The validate / render / repair loop of render_code, inside a job workdir."""
+    # Normalize indentation (dedent, then rebuild from block structure if it doesn't parse)
+    fixed_code = normalize_code(python_code)
     
     # Retry loop for repair
     max_retries = 3
     current_code = fixed_code
+    # Known errors are fixed by rule or learned patch; only unknown ones go to the LLM
+    repairs = RepairSession()
+    
+    output_filename = f"{scene_name.replace(' ', '_')}.mp4"
     
     for attempt in range(max_retries + 1):
-        # Indent the code to fit inside the class
-        indented_code = "\n        ".join(current_code.splitlines())
-        full_script = TEMPLATE.format(code=indented_code)
-        
-        temp_file = f"temp_{scene_name.lower().replace(' ', '_')}.py"
+        # Pre-flight: catch broken code in-process instead of paying for a manim launch.
+        # On the last attempt we render anyway and let manim have the final word.
+        issues = validate_code(current_code)
+        errors = [issue for issue in issues if issue['severity'] == 'error']
+        if issues:
+            console.print(f"[dim]Validation for {scene_name}:\n{format_issues(issues)}[/dim]")
+        if errors and attempt < max_retries:
+            console.print(f"[bold yellow]Pre-flight validation failed for {scene_name}, attempting to repair code...[/bold yellow]")
+            with tracing.span("repair", scene=scene_name, attempt=attempt + 1):
+                repaired, source = repairs.repair(current_code, format_issues(errors))
+                tracing.add(source=source)
+            console.print(f"[dim]Repaired {scene_name} ({source}).[/dim]")
+            current_code = normalize_code(repaired)
+            continue
         
-        with open(temp_file, "w") as f:
-            f.write(full_script)
-            
-        # Run Manim
-        # -ql = Quality Low (faster for testing)
-        # --media_dir = specify output directory
-        # -o = specify output filename explicitly to make it predictable
-        output_filename = f"{scene_name.replace(' ', '_')}.mp4"
+        full_script = wrap_code(current_code)
         
-        cmd = [
-            "manim",
-            "-ql",
-            "--media_dir", output_dir,
-            "-o", output_filename,
-            temp_file,
-            "GeneratedScene"
-        ]
+        # Identical scripts render to identical videos - reuse a previous render if we have one
+        key = render_cache.script_key(full_script, quality_flags())
+        cached_path = render_cache.lookup(key)
+        if cached_path:
+            console.print(f"[dim]Render cache hit for {scene_name}.[/dim]")
+            repairs.succeeded()
+            return cached_path
         
-        console.print(f"[bold blue]Rendering scene: {scene_name} (Attempt {attempt+1}/{max_retries+1})...[/bold blue]")
+        result = render_tiers(full_script, workdir, output_filename, scene_name, attempt, max_retries + 1)
         
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            console.print(f"[bold green]Successfully rendered {scene_name}![/bold green]")
+        if result['ok']:
+            console.print(f"[bold green]Successfully rendered {scene_name} in {result['duration']:.1f}s![/bold green]")
+            repairs.succeeded()
+            video_path = result['path']
             
-            # Construct the expected output path
-            # Manim structure: {media_dir}/videos/{temp_file_basename}/480p15/{output_filename}
-            import re
-            match = re.search(r"File ready at '(.+?)'", result.stdout)
-            match_stderr = re.search(r"File ready at '(.+?)'", result.stderr) # Manim often prints to stderr
-            
-            if match:
-                return match.group(1)
-            elif match_stderr:
-                return match_stderr.group(1)
-            else:
-                # Fallback guess
-                module_name = temp_file.replace(".py", "")
-                possible_path = os.path.join(output_dir, "videos", module_name, "480p15", output_filename)
-                if os.path.exists(possible_path):
-                    return possible_path
-                
+            if video_path is None or not os.path.exists(video_path):
                 console.print(f"[yellow]Warning: Could not determine output path for {scene_name}[/yellow]")
                 return None
-                
-        except subprocess.CalledProcessError as e:
-            console.print(f"[bold red]Error rendering {scene_name}![/bold red]")
-            # console.print(e.stderr) # Too verbose, maybe just show last few lines?
             
-            if attempt < max_retries:
-                console.print(f"[bold yellow]Attempting to repair code...[/bold yellow]")
-                # Call repairer
-                from repairer import repair_code
-                # We pass the *inner* code (current_code) and the error
-                current_code = repair_code(current_code, e.stderr)
-                # Loop continues to next attempt with new code
-            else:
-                console.print("[bold red]Max retries reached. Giving up.[/bold red]")
-                console.print(e.stderr)
-                return None
-        finally:
-            # Cleanup temp file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            return keep_render(key, video_path, os.path.join(output_dir, output_filename), scene_name)
+        
+        console.print(f"[bold red]Error rendering {scene_name}![/bold red]")
+        
+        if attempt < max_retries:
+            console.print(f"[bold yellow]Attempting to repair code...[/bold yellow]")
+            # We pass the *inner* code (current_code) and the error, trimmed to the frames
+            # in that code (with its line numbers) and the exception itself
+            error = condense_error(result['error'], current_code, job_paths(workdir)['script'], BODY_FIRST_LINE)
+            with tracing.span("repair", scene=scene_name, attempt=attempt + 1):
+                repaired, source = repairs.repair(current_code, error)
+                tracing.add(source=source)
+            console.print(f"[dim]Repaired {scene_name} ({source}).[/dim]")
+            current_code = normalize_code(repaired)
+            # Loop continues to next attempt with new code
+        else:
+            console.print("[bold red]Max retries reached. Giving up.[/bold red]")
+            console.print(result['error'])
+            return None
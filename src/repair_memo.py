@@ -0,0 +1,392 @@
+import ast
+import difflib
+import json
+import os
+import re
+import threading
+import time
+
+from cache import CACHE_ROOT, cache_enabled
+from repairer import EXCEPTION_LINE, repair_code
+from validator import IMAGE_CLASSES, DRAW_ANIMATIONS, normalize_code
+
+MEMO_PATH = os.path.join(CACHE_ROOT, "repair_memo.json")
+
+# Learned patches are only kept when they are small enough to transfer to other scenes
+MAX_HUNKS = 5
+MAX_HUNK_LINES = 6
+MAX_PATCHES_PER_SIGNATURE = 10
+
+_lock = threading.Lock()
+_stats = {'rule': 0, 'memo': 0, 'llm': 0, 'learned': 0}
+
+# ---------------------------------------------------------------------------
+# Error signatures
+# ---------------------------------------------------------------------------
+
+ISSUE_LINE = re.compile(r"^line \d+: error: (.+)$")
+# Code line references: validator issues and condensed traceback frames ("line 4: ...")
+CODE_LINE = re.compile(r"^\s*line (\d+):")
+
+def _normalize(message):
+    message = re.sub(r"(/|[A-Za-z]:\\)[^\s'\"]+", "<path>", message)
+    message = re.sub(r"0x[0-9a-fA-F]+", "<addr>", message)
+    message = re.sub(r"\b\d+(\.\d+)?\b", "N", message)
+    return message.strip()
+
+def error_signatures(error_message):
+    """
+    Reduces a manim traceback (or a validator report) to stable signatures.
+
+    A signature is an error line with everything run-specific stripped:
+    file paths, line numbers, memory addresses and numbers. Identifiers are
+    kept, since they usually decide the fix. A traceback yields its final
+    exception; a validator report yields one signature per error.
+
+    Args:
+        error_message (str): Traceback / stderr / validator report.
+
+    Returns:
+        list: e.g. ["NameError: name 'Clear' is not defined"], most important first.
+    """
+    lines = [line.strip() for line in (error_message or "").strip().splitlines()]
+    issues = [match.group(1) for match in map(ISSUE_LINE.match, lines) if match]
+    if issues:
+        return [_normalize(issue) for issue in issues]
+    exceptions = [line for line in lines if EXCEPTION_LINE.match(line)]
+    if exceptions:
+        return [_normalize(exceptions[-1])]
+    return [_normalize(lines[-1])] if lines else []
+
+def error_lines(error_message):
+    """
+    Lines of the construct body an error points at.
+
+    Validator reports name every offending line; a condensed traceback
+    (repairer.condense_error) names the frames in the code, and the last
+    one is where the error surfaced.
+
+    Returns:
+        list: 1-based line numbers, possibly empty.
+    """
+    text = [line.strip() for line in (error_message or "").splitlines()]
+    issues = [int(CODE_LINE.match(line).group(1)) for line in text if ISSUE_LINE.match(line)]
+    if issues:
+        return issues
+    frames = [int(match.group(1)) for match in map(CODE_LINE.match, text) if match]
+    return frames[-1:]
+
+def error_signature(error_message):
+    """The primary signature of an error; the key learned patches are stored under."""
+    signatures = error_signatures(error_message)
+    return signatures[0] if signatures else ""
+
+# ---------------------------------------------------------------------------
+# Deterministic rewrite rules for errors REPAIR_SYSTEM_PROMPT already knows
+# ---------------------------------------------------------------------------
+
+def _call_name(node):
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+def _image_variables(tree):
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and _call_name(node.value) in IMAGE_CLASSES:
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+    return names
+
+def _is_image(node, images):
+    return _call_name(node) in IMAGE_CLASSES or (isinstance(node, ast.Name) and node.id in images)
+
+def _on_lines(node, lines):
+    return any(node.lineno <= line <= node.end_lineno for line in lines)
+
+def _rule_clear(tree, lines, signatures):
+    """NameError 'Clear' -> self.clear()"""
+    changed = False
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if not isinstance(body, list):
+            continue
+        for i, stmt in enumerate(body):
+            if isinstance(stmt, ast.Expr) and any(_call_name(n) == "Clear" for n in ast.walk(stmt)):
+                body[i] = ast.parse("self.clear()").body[0]
+                changed = True
+    return changed
+
+def _rule_vgroup_images(tree, lines, signatures):
+    """VGroup containing an ImageMobject -> Group"""
+    images = _image_variables(tree)
+    vgroups = [node for node in ast.walk(tree) if _call_name(node) == "VGroup"]
+    offending = [node for node in vgroups if any(_is_image(arg, images) for arg in node.args)]
+    if not offending:
+        # The image arrives through a variable we can't follow: only the VGroup the error names
+        offending = [node for node in vgroups if _on_lines(node, lines)]
+    for node in offending:
+        node.func.id = "Group"
+    return bool(offending)
+
+def _rule_draw_images(tree, lines, signatures):
+    """Write/Create on an ImageMobject -> FadeIn"""
+    images = _image_variables(tree)
+    changed = False
+    for node in ast.walk(tree):
+        if _call_name(node) in DRAW_ANIMATIONS and node.args and _is_image(node.args[0], images):
+            node.func.id = "FadeIn"
+            changed = True
+    return changed
+
+LATEX_SYMBOLS = {
+    "checkmark": "✓", "checkbox": "☐", "times": "×", "rightarrow": "→", "to": "→",
+    "leftarrow": "←", "Rightarrow": "⇒", "cdot": "·", "bullet": "•", "item": "•",
+    "pm": "±", "leq": "≤", "geq": "≥", "neq": "≠", "infty": "∞", "alpha": "α",
+    "beta": "β", "gamma": "γ", "delta": "δ", "lambda": "λ", "pi": "π", "sigma": "σ",
+}
+TEXT_KEYWORDS = {"font_size", "color", "weight", "slant", "font", "line_spacing"}
+
+def _plain_text(value):
+    value = re.sub(r"\\(?:textbf|textit|text|mathrm|mathbf|emph|underline)\{([^{}]*)\}", r"\1", value)
+    value = re.sub(r"\\([A-Za-z]+)", lambda m: LATEX_SYMBOLS.get(m.group(1), ""), value)
+    return re.sub(r"[{}$]", "", value).replace("\\\\", "\n")
+
+# Which constructors each kind of text error can come from
+LATEX_ERROR_CLASSES = [
+    (re.compile(r"Pango markup|MarkupText", re.IGNORECASE), ("MarkupText",)),
+    (re.compile(r"latex|dvi|Tex", re.IGNORECASE), ("Tex", "MathTex")),
+]
+
+def _latex_targets(tree, lines, signatures):
+    """The Tex/MathTex/MarkupText calls a text error can be pinned on, or [] if it can't."""
+    classes = set()
+    for pattern, names in LATEX_ERROR_CLASSES:
+        if any(pattern.search(sig) for sig in signatures):
+            classes.update(names)
+            break  # the first (most specific) kind named wins
+    calls = [node for node in ast.walk(tree) if _call_name(node) in classes]
+    on_lines = [node for node in calls if _on_lines(node, lines)]
+    if on_lines:
+        return on_lines
+    # The error line only uses the object (e.g. in self.play): fine if there is a single suspect
+    return calls if len(calls) == 1 else []
+
+def _rule_latex(tree, lines, signatures):
+    """LaTeX failure -> Text / Pango-safe MarkupText, on the call the error points at only"""
+    changed = False
+    for node in _latex_targets(tree, lines, signatures):
+        name = _call_name(node)
+        for i, arg in enumerate(node.args):
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                node.args[i] = ast.Constant(_plain_text(arg.value))
+        if name != "MarkupText":
+            node.func.id = "Text"
+            node.keywords = [kw for kw in node.keywords if kw.arg in TEXT_KEYWORDS]
+            # Text takes a single string; Tex("a", "b") becomes Text("ab")
+            strings = [arg for arg in node.args if isinstance(arg, ast.Constant) and isinstance(arg.value, str)]
+            if len(strings) == len(node.args) and len(strings) > 1:
+                node.args = [ast.Constant("".join(arg.value for arg in strings))]
+        changed = True
+    return changed
+
+RULES = [
+    (re.compile(r"name 'Clear' is not defined"), _rule_clear),
+    (re.compile(r"VGroup.*(ImageMobject|only accepts)|ImageMobject.*VGroup"), _rule_vgroup_images),
+    (re.compile(r"(Write|Create) cannot draw an ImageMobject|'ImageMobject' object has no attribute"), _rule_draw_images),
+    (re.compile(r"latex|dvi|Pango markup", re.IGNORECASE), _rule_latex),
+]
+
+def apply_rules(code, signatures, lines=()):
+    """
+    Applies the deterministic rewrites for every known error signature.
+
+    Rules only rewrite what the error can be pinned on; when they can't
+    tell which call failed they change nothing, and the memo / LLM get it.
+
+    Args:
+        lines (list): Body lines the error points at (see error_lines).
+
+    Returns:
+        str: The rewritten code, or None if no rule applies (or nothing changed).
+    """
+    rules = [rule for pattern, rule in RULES if any(pattern.search(sig) for sig in signatures)]
+    if not rules:
+        return None
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    changed = False
+    for rule in rules:
+        changed = rule(tree, lines, signatures) or changed
+    if not changed:
+        return None
+    fixed = normalize_code(ast.unparse(tree))
+    return fixed if fixed != code else None
+
+# ---------------------------------------------------------------------------
+# Learned patches
+# ---------------------------------------------------------------------------
+
+def _load_memo():
+    try:
+        with open(MEMO_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_memo(memo):
+    os.makedirs(os.path.dirname(MEMO_PATH), exist_ok=True)
+    tmp_path = f"{MEMO_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(memo, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, MEMO_PATH)
+
+def _diff_hunks(broken, fixed):
+    """Line-level replace hunks turning broken into fixed, or None if the patch is not transferable."""
+    old = [line.strip() for line in broken.splitlines()]
+    new = [line.strip() for line in fixed.splitlines()]
+    hunks = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        # Pure insertions have no anchor in another scene's code
+        if i1 == i2 or i2 - i1 > MAX_HUNK_LINES or j2 - j1 > MAX_HUNK_LINES:
+            return None
+        hunks.append([old[i1:i2], new[j1:j2]])
+    if not hunks or len(hunks) > MAX_HUNKS:
+        return None
+    return hunks
+
+def _apply_hunks(code, hunks):
+    lines = code.splitlines()
+    for old, new in hunks:
+        stripped = [line.strip() for line in lines]
+        for start in range(len(lines) - len(old) + 1):
+            if stripped[start:start + len(old)] == old:
+                indent = lines[start][:len(lines[start]) - len(lines[start].lstrip())]
+                lines[start:start + len(old)] = [indent + line if line else "" for line in new]
+                break
+        else:
+            return None
+    return "\n".join(lines)
+
+def apply_memo(code, signatures):
+    """
+    Replays a patch learned from an earlier LLM repair of the same error.
+
+    Returns:
+        str: The patched code, or None if no stored patch applies.
+    """
+    if not cache_enabled():
+        return None
+    with _lock:
+        patches = _load_memo().get(signatures[0], []) if signatures else []
+    for patch in sorted(patches, key=lambda p: -p.get("hits", 0)):
+        fixed = _apply_hunks(code, patch["hunks"])
+        if fixed is None or fixed == code:
+            continue
+        fixed = normalize_code(fixed)
+        try:
+            ast.parse(fixed)
+        except SyntaxError:
+            continue
+        return fixed
+    return None
+
+def learn(signature, broken, fixed):
+    """Stores the diff of a successful LLM repair under its error signature."""
+    if not cache_enabled() or not signature:
+        return
+    hunks = _diff_hunks(broken, fixed)
+    if hunks is None:
+        return
+    with _lock:
+        memo = _load_memo()
+        patches = memo.setdefault(signature, [])
+        for patch in patches:
+            if patch["hunks"] == hunks:
+                patch["hits"] = patch.get("hits", 0) + 1
+                break
+        else:
+            patches.append({"hunks": hunks, "hits": 1, "learned": time.time()})
+            del patches[:-MAX_PATCHES_PER_SIGNATURE]
+            _stats['learned'] += 1
+        _save_memo(memo)
+
+# ---------------------------------------------------------------------------
+# Repair session used by the renderer
+# ---------------------------------------------------------------------------
+
+class RepairSession:
+    """
+    Repairs one scene across render attempts: rules, then memo, then LLM.
+
+    A rule or memo fix that doesn't make its error go away is not offered
+    again for that signature. An LLM fix is learned as soon as its error is
+    gone (the next attempt renders, or fails differently).
+    """
+
+    def __init__(self):
+        self.tried = set()
+        self.pending = None  # (signature, broken, fixed, source) of the last fix
+
+    def _settle(self, new_signature=None):
+        if self.pending is None:
+            return
+        signature, broken, fixed, source = self.pending
+        self.pending = None
+        if new_signature == signature:
+            self.tried.add((signature, source))
+        elif source == 'llm':
+            learn(signature, broken, fixed)
+
+    def repair(self, code, error_message):
+        """
+        Fixes code for the given error.
+
+        Returns:
+            tuple: (fixed_code, source) where source is 'rule', 'memo' or 'llm'.
+        """
+        signatures = error_signatures(error_message)
+        signature = signatures[0] if signatures else ""
+        self._settle(signature)
+
+        lines = error_lines(error_message)
+        fixes = (('rule', lambda: apply_rules(code, signatures, lines)), ('memo', lambda: apply_memo(code, signatures)))
+        for source, fix in fixes:
+            if (signature, source) in self.tried:
+                continue
+            fixed = fix()
+            if fixed:
+                with _lock:
+                    _stats[source] += 1
+                self.pending = (signature, code, fixed, source)
+                return fixed, source
+
+        fixed = repair_code(code, error_message)
+        with _lock:
+            _stats['llm'] += 1
+        if fixed != code:
+            self.pending = (signature, code, fixed, 'llm')
+        return fixed, 'llm'
+
+    def succeeded(self):
+        """Call once the scene renders: confirms the last fix."""
+        self._settle()
+
+def stats_summary():
+    """
+    Summarises how repairs were made.
+
+    Returns:
+        str: One-line summary, or "" if nothing was repaired.
+    """
+    with _lock:
+        total = _stats['rule'] + _stats['memo'] + _stats['llm']
+        if not total:
+            return ""
+        avoided = _stats['rule'] + _stats['memo']
+        return (f"{total} repairs: {_stats['rule']} by rule, {_stats['memo']} from memo, "
+                f"{_stats['llm']} by LLM ({avoided / total:.0%} of LLM round-trips avoided, "
+                f"{_stats['learned']} new patches learned)")
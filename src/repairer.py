@@ -1,13 +1,18 @@
+import ast
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import re
 
-load_dotenv()
+from llm import default_model, chat_completion, stream_code_completion, streaming_enabled, strip_fences
+import tracing
+from validator import normalize_code
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-)
+COMMON_FIXES = """Common Fixes:
+- NameError 'Clear' -> Use `self.clear()` or `self.remove(mobj)`.
+- LaTeX Error -> The user might have used invalid LaTeX. Switch to `Text` or `MarkupText` if `Tex` fails, or fix the LaTeX syntax.
+- IndentationError -> Ensure correct indentation.
+- TypeError (VGroup) -> If adding ImageMobject to VGroup, change VGroup to Group.
+- Write/Create on Image -> Change to FadeIn or ScaleInPlace.
+"""
 
 REPAIR_SYSTEM_PROMPT = """You are a Manim Code Repairer.
 Your job is to fix Python code that caused an error when running Manim.
@@ -23,25 +28,302 @@ Instructions:
 4. Do NOT output the class definition, just the inner code.
 5. Do not explain your fix, just output the code.
 
-Common Fixes:
-- NameError 'Clear' -> Use `self.clear()` or `self.remove(mobj)`.
-- LaTeX Error -> The user might have used invalid LaTeX. Switch to `Text` or `MarkupText` if `Tex` fails, or fix the LaTeX syntax.
-- IndentationError -> Ensure correct indentation.
-- TypeError (VGroup) -> If adding ImageMobject to VGroup, change VGroup to Group.
-- Write/Create on Image -> Change to FadeIn or ScaleInPlace.
-"""
+""" + COMMON_FIXES
+
+# Output instructions of the patch formats; the code is shown with line numbers ("  12| ...")
+PATCH_INSTRUCTIONS = {
+    "edit": """Output ONLY line-range edits, one block per change:
+REPLACE <first>-<last>
+<replacement lines, indented as in the code>
+END
+Lines <first> to <last> (inclusive, numbers as shown) are replaced by the block's lines.
+An empty block deletes them; to insert, replace a line with itself plus the new lines.
+Change as few lines as possible.""",
+    "diff": """Output ONLY a minimal unified diff of the code (@@ hunks with a line of context,
+'-' for removed lines, '+' for added lines; no --- / +++ headers needed).
+Do not include the line-number prefixes in the diff.""",
+}
+
+PATCH_SYSTEM_PROMPT = """You are a Manim Code Repairer.
+Your job is to fix Python code that caused an error when running Manim.
+
+You will be given:
+1. The broken code (the body of `construct(self):`), with line numbers.
+2. The relevant part of the error traceback, with line numbers of that code.
+
+Instructions:
+1. Analyze the error.
+2. Fix the code to resolve the error.
+3. {format_instructions}
+4. Do not explain your fix.
+
+""" + COMMON_FIXES
+
+# --repair-format: complete code back ("full"), or a patch applied locally ("edit", "diff")
+REPAIR_FORMATS = ("full", "edit", "diff")
+_repair_format = os.getenv("MANIMATOR_REPAIR_FORMAT", "full")
+
+# How much of the exception message itself is kept
+MAX_ERROR_LINES = 12
+MAX_ERROR_CHARS = 1500
+
+EXCEPTION_LINE = re.compile(r"^[A-Za-z_][\w.]*(?:Error|Exception)\b")
+# Traceback frames: plain Python ('File "x.py", line 3, in f') and rich, as printed by the manim CLI ('x.py:3 in f')
+FRAME_LINE = re.compile(r'File "(?P<file>[^"]+)", line (?P<line>\d+), in (?P<func>\S+)')
+RICH_FRAME_LINE = re.compile(r"(?P<file>\S+\.py):(?P<line>\d+) in (?P<func>\S+)")
+# Rich draws tracebacks inside a box
+BOX_CHARS = " │╭╮╰╯─"
+
+def set_repair_format(name):
+    """
+    Selects what the repair model returns.
+
+    Args:
+        name (str): One of REPAIR_FORMATS ("full", "edit", "diff").
+    """
+    global _repair_format
+    if name not in REPAIR_FORMATS:
+        raise ValueError(f"Unknown repair format: {name}")
+    _repair_format = name
+
+def _frames(lines):
+    """Traceback frame matches (file, line, func groups) in the order printed: outermost first."""
+    matches = (FRAME_LINE.search(line) or RICH_FRAME_LINE.search(line) for line in lines)
+    return [match for match in matches if match]
+
+def script_lines(error_message, script_path):
+    """
+    Line numbers of the traceback frames inside the rendered script, outermost first.
+
+    The last one is where the error surfaced in the generated code.
+    """
+    script_path = os.path.abspath(script_path)
+    lines = [line.strip(BOX_CHARS) for line in (error_message or "").splitlines()]
+    # Whole paths: manim has a scene.py of its own
+    return [int(match.group("line")) for match in _frames(lines)
+            if os.path.abspath(match.group("file")) == script_path]
+
+def condense_error(error_message, code, script_path, first_line):
+    """
+    Cuts a manim traceback down to what a repair needs.
+
+    Frames in the generated script are kept and mapped back to lines of the
+    construct body (with their source), the innermost library frame is kept
+    as a hint, and manim's internal frames and log output are dropped. Messages
+    that are not tracebacks (e.g. validator reports) pass through, truncated.
+
+    Args:
+        error_message (str): Traceback / stderr of the failed render.
+        code (str): The construct body that was rendered.
+        script_path (str): Path the full script was rendered from.
+        first_line (int): Script line number of the first body line.
+
+    Returns:
+        str: The condensed error.
+    """
+    lines = [line.strip(BOX_CHARS) for line in (error_message or "").strip().splitlines()]
+    body = code.splitlines()
+    script_path = os.path.abspath(script_path)
+
+    frames = []
+    matches = _frames(lines)
+    for match in matches:
+        # Whole paths: manim has a scene.py of its own
+        if os.path.abspath(match.group("file")) != script_path:
+            continue
+        number = int(match.group("line")) - first_line + 1
+        if 1 <= number <= len(body):
+            frames.append(f"  line {number}: {body[number - 1].strip()}")
+        else:
+            frames.append(f"  (scene template, in {match.group('func')})")
+    if matches and os.path.abspath(matches[-1].group("file")) != script_path:
+        last_frame = matches[-1]
+        library_path = last_frame.group("file").replace("\\", "/")
+        # site-packages/manim/animation/creation.py -> manim/animation/creation.py
+        library_path = library_path[library_path.find("manim/"):] if "manim/" in library_path else os.path.basename(library_path)
+        frames.append(f"  ... in {library_path}:{last_frame.group('line')} ({last_frame.group('func')})")
+
+    exception_index = max((i for i, line in enumerate(lines) if EXCEPTION_LINE.match(line)), default=None)
+    if exception_index is not None:
+        message = [line for line in lines[exception_index:] if line][:MAX_ERROR_LINES]
+    else:
+        message = [line for line in lines if line][-MAX_ERROR_LINES:]
+    message = "\n".join(message)[:MAX_ERROR_CHARS]
+
+    if not frames:
+        return message
+    return "Traceback (line numbers of the code above):\n" + "\n".join(frames) + "\n" + message
+
+def number_lines(code):
+    """Prefixes every line with its 1-based number, as shown to the model in patch formats."""
+    lines = code.splitlines()
+    width = len(str(len(lines)))
+    return "\n".join(f"{i:>{width}}| {line}" for i, line in enumerate(lines, 1))
+
+NUMBER_PREFIX = re.compile(r"^\s*\d+\| ?")
+
+def _unnumber(lines):
+    """Drops line-number prefixes the model copied from the listing (only if every line has one)."""
+    if lines and all(NUMBER_PREFIX.match(line) for line in lines if line.strip()):
+        return [NUMBER_PREFIX.sub("", line) for line in lines]
+    return lines
+
+EDIT_HEADER = re.compile(r"^REPLACE\s+(\d+)\s*-\s*(\d+)\s*$")
+
+def apply_edits(code, edits):
+    """
+    Applies REPLACE <first>-<last> ... END blocks to code.
+
+    Returns:
+        str: The edited code, or None if the edits are malformed or overlap.
+    """
+    lines = code.splitlines()
+    blocks = []
+    current = None
+    for line in edits.splitlines():
+        header = EDIT_HEADER.match(line.strip())
+        if current is None:
+            if header:
+                current = (int(header.group(1)), int(header.group(2)), [])
+            elif line.strip():
+                return None  # text outside a block
+        elif line.strip() == "END":
+            blocks.append(current)
+            current = None
+        else:
+            current[2].append(line)
+    if current is not None or not blocks:
+        return None
+
+    # Bottom-up, so earlier line numbers stay valid
+    previous_first = len(lines) + 1
+    for first, last, replacement in sorted(blocks, key=lambda block: -block[0]):
+        if not 1 <= first <= last + 1 or last > len(lines) or last >= previous_first:
+            return None
+        lines[first - 1:last] = _unnumber(replacement)
+        previous_first = first
+    return "\n".join(lines)
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+def apply_unified_diff(code, diff):
+    """
+    Applies a unified diff to code.
+
+    Hunks are located by their content (context and removed lines, compared
+    without surrounding whitespace) nearest to the line the header names, so
+    slightly wrong line counts in model output still apply.
+
+    Returns:
+        str: The patched code, or None if a hunk does not match.
+    """
+    hunks = []
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            hunks.append((int(header.group(1)), [], []))
+            continue
+        if line.startswith(("---", "+++")) or not hunks:
+            continue
+        start, old, new = hunks[-1]
+        if line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        else:
+            # Context (the leading space may have been trimmed by the model)
+            old.append(line[1:] if line.startswith(" ") else line)
+            new.append(line[1:] if line.startswith(" ") else line)
+    if not hunks:
+        return None
 
-def repair_code(broken_code, error_message):
+    lines = code.splitlines()
+    offset = 0  # line shift from the hunks applied so far
+    for start, old, new in hunks:
+        while old and not old[-1].strip() and new and not new[-1].strip():
+            old.pop()
+            new.pop()
+        stripped = [line.strip() for line in lines]
+        wanted = [line.strip() for line in old]
+        candidates = [i for i in range(len(lines) - len(wanted) + 1) if stripped[i:i + len(wanted)] == wanted]
+        if not candidates or not wanted:
+            return None
+        index = min(candidates, key=lambda i: abs(i - (start - 1 + offset)))
+        lines[index:index + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines)
+
+def _apply_patch(code, content, fmt):
+    """Applies a patch-format reply; returns the fixed code only if it still parses."""
+    content = re.sub(r"^```[\w-]*\n|\n?```$", "", content.strip())
+    patched = apply_edits(code, content) if fmt == "edit" else apply_unified_diff(code, content)
+    if patched is None or patched.strip() == code.strip():
+        return None
+    patched = normalize_code(patched)
+    try:
+        ast.parse(patched)
+    except SyntaxError:
+        return None
+    return patched
+
+def _repair_patch(broken_code, error_message, fmt, model):
+    """
+    Asks for an edit/diff and applies it. Returns the fixed code, or None to fall back to a full repair.
+
+    Never streamed: the stream's early-abort checks expect Python code, and a
+    patch ("REPLACE 1-1", "@@ -1 +1 @@") is short anyway.
+    """
+    user_prompt = f"""
+    ### BROKEN CODE (line numbers are not part of the code):
+{number_lines(broken_code)}
+    
+    ### ERROR MESSAGE:
+    {error_message}
+    
+    ### TASK:
+    Fix the code to solve the error. Output only the {'edits' if fmt == 'edit' else 'diff'}.
+    """
+    system_prompt = PATCH_SYSTEM_PROMPT.format(format_instructions=PATCH_INSTRUCTIONS[fmt])
+    try:
+        content = chat_completion(model, system_prompt, user_prompt, temperature=0.2)
+    except Exception as e:
+        print(f"Repair ({fmt}) failed: {e}")
+        content = ""
+    fixed = _apply_patch(broken_code, content, fmt)
+    if fixed is None:
+        print(f"Repair {fmt} did not apply, asking for the full code.")
+    tracing.add(repair_format=fmt if fixed is not None else f"{fmt} -> full")
+    return fixed
+
+def repair_code(broken_code, error_message, stream=None, fmt=None):
     """
     Uses LLM to repair broken Manim code based on the error message.
     
     Args:
         broken_code (str): The code that failed.
         error_message (str): The error traceback.
+        stream (bool): Stream the completion and abort early on unusable output
+                       (full repairs only). Defaults to the global streaming setting (--stream).
+        fmt (str): One of REPAIR_FORMATS. Patch formats ("edit", "diff") only
+                   ask for the changed lines; a patch that does not apply or
+                   does not parse falls back to a "full" repair.
+                   Defaults to the global setting (--repair-format).
         
     Returns:
         str: The fixed code.
     """
+    fmt = fmt or _repair_format
+    model = default_model()
+    
+    if stream is None:
+        stream = streaming_enabled()
+    complete = stream_code_completion if stream else chat_completion
+    
+    if fmt != "full":
+        fixed = _repair_patch(broken_code, error_message, fmt, model)
+        if fixed is not None:
+            return fixed
+    
     user_prompt = f"""
     ### BROKEN CODE:
     {broken_code}
@@ -53,29 +335,16 @@ def repair_code(broken_code, error_message):
     Fix the code to solve the error. Output only the code inside construct(self).
     """
     
-    model = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001")
-    
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
+        content = complete(
+            model,
+            REPAIR_SYSTEM_PROMPT,
+            user_prompt,
             temperature=0.2, # Lower temperature for more deterministic fixes
         )
         
-        code = response.choices[0].message.content.strip()
-        
         # Cleanup markdown fences
-        if code.startswith("```python"):
-            code = code[9:]
-        if code.startswith("```"):
-            code = code[3:]
-        if code.endswith("```"):
-            code = code[:-3]
-            
-        return code.strip()
+        return strip_fences(content)
         
     except Exception as e:
         print(f"Repair failed: {e}")
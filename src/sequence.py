@@ -0,0 +1,225 @@
+import ast
+import os
+import re
+from rich.console import Console
+
+import render_cache
+import renderer
+from cache import cache_key
+import tracing
+from repair_memo import RepairSession
+from repairer import condense_error, script_lines
+from validator import normalize_code, validate_code, format_issues
+
+console = Console()
+
+# Repair attempts per scene before the sequence gives up (the caller then renders scenes one by one)
+MAX_REPAIRS_PER_SCENE = 3
+
+# Section names are "scene_<index>", so each section video maps back to its scene
+SECTION_NAME = re.compile(r"^scene_(\d+)$")
+
+def _is_section_call(node):
+    return (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+            and isinstance(node.value.func, ast.Attribute) and node.value.func.attr == "next_section"
+            and isinstance(node.value.func.value, ast.Name) and node.value.func.value.id == "self")
+
+def strip_sections(code):
+    """
+    Neutralises the scene's own self.next_section() calls, so sections map 1:1 to scenes.
+
+    Each call becomes `pass` (continuation lines become blank), which keeps
+    every other line where it was: traceback line numbers stay valid.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    lines = code.splitlines()
+    for node in ast.walk(tree):
+        if not _is_section_call(node):
+            continue
+        first = lines[node.lineno - 1]
+        lines[node.lineno - 1] = first[:node.col_offset] + "pass"
+        for i in range(node.lineno, node.end_lineno):
+            lines[i] = ""
+    return "\n".join(lines)
+
+def bound_names(code):
+    """Variables a construct body assigns at its top level (the ones a later scene can reuse)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    names = []
+    for node in tree.body:
+        targets = []
+        if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        elif isinstance(node, (ast.For, ast.With)):
+            targets = [node.target] if isinstance(node, ast.For) else [item.optional_vars for item in node.items]
+        for target in targets:
+            for name in ast.walk(target) if target is not None else []:
+                if isinstance(name, ast.Name) and name.id not in names:
+                    names.append(name.id)
+    return names
+
+def free_names(code):
+    """Names a construct body reads but never binds itself."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    bound = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)}
+    bound.update(node.arg for node in ast.walk(tree) if isinstance(node, ast.arg))
+    bound.update(node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.ClassDef)))
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)} - bound
+
+def compose(codes):
+    """
+    Joins consecutive scene bodies into one construct body, one section per scene.
+
+    A scene that reads none of the earlier scenes' variables starts from a
+    cleared screen, like it would in a Scene of its own; a scene that does
+    reuse them keeps everything on screen and manages it itself.
+
+    Args:
+        codes (list): Construct bodies, in playback order.
+
+    Returns:
+        tuple: (body, starts) where starts[k] is the body line number of scene k's first line.
+    """
+    lines = []
+    starts = []
+    earlier = set()
+    for index, code in enumerate(codes):
+        lines.append(f'self.next_section("scene_{index:03d}")')
+        if index and not free_names(code) & earlier:
+            lines.append("self.clear()")
+        starts.append(len(lines) + 1)
+        lines.extend(strip_sections(code).splitlines())
+        earlier.update(bound_names(code))
+    return "\n".join(lines), starts
+
+def _scene_at(line, starts, codes):
+    """Maps a composed body line to (scene index, line within that scene), or (None, None) for glue lines."""
+    for index in reversed(range(len(starts))):
+        if line >= starts[index]:
+            local = line - starts[index] + 1
+            if local <= len(codes[index].splitlines()):
+                return index, local
+            return None, None
+    return None, None
+
+def section_keys(codes):
+    """
+    Render cache keys of each scene's section.
+
+    A section depends on its own code and on everything that ran before it
+    (carried mobjects), but not on later scenes: its key covers the composed
+    prefix up to and including it.
+    """
+    return [cache_key(render_cache.script_key(renderer.wrap_code(compose(codes[:index + 1])[0]),
+                                              renderer.quality_flags()), "section")
+            for index in range(len(codes))]
+
+def render_sequence(scenes, codes, output_dir="output"):
+    """
+    Renders consecutive scenes as sections of a single Scene, in one manim run.
+
+    Objects built by one scene stay available to the next, and manim (or a
+    warm worker) starts once instead of once per scene. Errors are traced
+    back to the scene they come from and only that scene's code is repaired;
+    each section is cached under its scene's prefix.
+
+    Args:
+        scenes (list): Scene dicts, in playback order.
+        codes (list): Their construct bodies.
+        output_dir (str): Directory the section videos are moved to.
+
+    Returns:
+        list: Video path per scene; None for a scene that produced no video
+        (or for all of them, if the sequence could not be rendered).
+    """
+    codes = [normalize_code(code) for code in codes]
+    repairs = [RepairSession() for _ in scenes]
+    repaired = [0] * len(scenes)
+    label = f"{scenes[0]['scene_name']} .. {scenes[-1]['scene_name']}" if len(scenes) > 1 else scenes[0]['scene_name']
+    failed = [None] * len(scenes)
+
+    with renderer.job_workdir("sequence") as workdir:
+        script_path = renderer.job_paths(workdir)['script']
+        attempt = 0
+        while True:
+            body, starts = compose(codes)
+
+            # Pre-flight on the composed body: earlier scenes' variables are defined there
+            errors = [issue for issue in validate_code(body) if issue['severity'] == 'error']
+            index = None
+            if errors:
+                index, _ = _scene_at(errors[0]['line'], starts, codes)
+            if index is not None:
+                if repaired[index] >= MAX_REPAIRS_PER_SCENE:
+                    console.print(f"[bold red]Giving up on the sequence ({scenes[index]['scene_name']} keeps failing).[/bold red]")
+                    return failed
+                issues = []
+                for issue in errors:
+                    scene_index, line = _scene_at(issue['line'], starts, codes)
+                    if scene_index == index:
+                        issues.append(dict(issue, line=line))
+                codes[index] = _repair(scenes[index], codes[index], repairs[index], format_issues(issues), repaired[index])
+                repaired[index] += 1
+                continue
+
+            keys = section_keys(codes)
+            cached = [render_cache.lookup(key) for key in keys]
+            if all(cached):
+                console.print(f"[dim]Render cache hit for {label}.[/dim]")
+                for session in repairs:
+                    session.succeeded()
+                return cached
+
+            result = renderer.render_tiers(renderer.wrap_code(body), workdir, "sequence.mp4", label, attempt,
+                                           MAX_REPAIRS_PER_SCENE * len(scenes) + 1, sections=True)
+            attempt += 1
+            if result['ok']:
+                console.print(f"[bold green]Successfully rendered {label} in {result['duration']:.1f}s![/bold green]")
+                for session in repairs:
+                    session.succeeded()
+                return _keep_sections(scenes, keys, result['sections'], output_dir)
+
+            console.print(f"[bold red]Error rendering {label}![/bold red]")
+            frames = script_lines(result['error'], script_path)
+            index, _ = _scene_at(frames[-1] - renderer.BODY_FIRST_LINE + 1, starts, codes) if frames else (None, None)
+            if index is None or repaired[index] >= MAX_REPAIRS_PER_SCENE:
+                console.print("[bold red]Could not repair the sequence. Giving up.[/bold red]")
+                console.print(result['error'])
+                return failed
+            error = condense_error(result['error'], codes[index], script_path,
+                                   renderer.BODY_FIRST_LINE + starts[index] - 1)
+            codes[index] = _repair(scenes[index], codes[index], repairs[index], error, repaired[index])
+            repaired[index] += 1
+
+def _repair(scene, code, session, error, attempt):
+    name = scene['scene_name']
+    console.print(f"[bold yellow]Repairing {name} in the sequence...[/bold yellow]")
+    with tracing.span("repair", scene=name, attempt=attempt + 1):
+        fixed, source = session.repair(code, error)
+        tracing.add(source=source)
+    console.print(f"[dim]Repaired {name} ({source}).[/dim]")
+    return normalize_code(fixed)
+
+def _keep_sections(scenes, keys, sections, output_dir):
+    paths = [None] * len(scenes)
+    for section in sections:
+        match = SECTION_NAME.match(section['name'])
+        if not match or not os.path.exists(section['path']):
+            continue
+        index = int(match.group(1))
+        name = scenes[index]['scene_name']
+        paths[index] = renderer.keep_render(keys[index], section['path'],
+                                            os.path.join(output_dir, f"{name.replace(' ', '_')}.mp4"), name)
+    for scene, path in zip(scenes, paths):
+        if path is None:
+            console.print(f"[yellow]Warning: {scene['scene_name']} produced no video (no animations?).[/yellow]")
+    return paths
@@ -0,0 +1,146 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from checker import check_code
+from generator import generate_scene_code
+from validator import normalize_code, validate_code
+import tracing
+
+# Candidates requested per scene (--candidates); 1 disables speculation
+_candidates = 1
+# Extra candidate generations allowed for the whole run (--speculation-budget); None = unlimited
+_budget = None
+
+_lock = threading.Lock()
+_stats = {
+    'scenes': 0,          # scenes that were speculated on
+    'extra_calls': 0,     # generations beyond the first per scene
+    'paid_off': 0,        # winner was not candidate 0
+    'no_winner': 0,       # no candidate passed
+    'wins_by_index': {},  # candidate index -> wins
+}
+
+def configure(candidates=1, budget=None):
+    """
+    Sets up speculative generation.
+
+    Args:
+        candidates (int): Candidates requested per scene (K).
+        budget (int): Maximum extra generations (K - 1 per scene) for the
+            whole run, or None for no cap. Once exhausted, scenes fall back
+            to a single candidate.
+    """
+    global _candidates, _budget
+    _candidates = max(1, candidates)
+    _budget = budget
+
+def _reserve(k):
+    """Reserves budget for up to k candidates; returns how many may be requested."""
+    global _budget
+    with _lock:
+        if _budget is None:
+            granted = k
+        else:
+            granted = 1 + min(k - 1, max(0, _budget))
+            _budget -= granted - 1
+        _stats['extra_calls'] += granted - 1
+        return granted
+
+def candidates_for_scene():
+    """Number of candidates the next scene would get, without reserving budget."""
+    with _lock:
+        if _budget is None:
+            return _candidates
+        return 1 + min(_candidates - 1, max(0, _budget))
+
+def _evaluate(scene, index, cancel):
+    """
+    Generates, validates and checks one candidate.
+
+    Returns:
+        tuple: (index, code, valid, passed, feedback)
+    """
+    # Candidates run on their own threads, so each is a top-level span
+    with tracing.span("generate candidate", scene=scene['scene_name'], candidate=index):
+        code = generate_scene_code(scene, sample=index, cancel_event=cancel)
+    if cancel.is_set():
+        return index, code, False, False, "cancelled"
+
+    errors = [issue for issue in validate_code(normalize_code(code)) if issue['severity'] == 'error']
+    if errors:
+        return index, code, False, False, "; ".join(issue['message'] for issue in errors)
+
+    with tracing.span("check", scene=scene['scene_name'], candidate=index):
+        passed, feedback = check_code(code, scene)
+    return index, code, True, passed, feedback
+
+def speculative_generate(scene):
+    """
+    Requests several candidates for a scene at once and keeps the first valid one.
+
+    Candidates are generated, validated and checked in parallel. As soon as
+    one passes, the others are cancelled (queued ones never start, streamed
+    ones stop reading).
+
+    Args:
+        scene (dict): The scene to generate.
+
+    Returns:
+        tuple: (code, passed, feedback). If no candidate passed, the first
+        candidate that finished without validation errors (else the first
+        to finish) is returned with its verdict: False, or None if the critic
+        could not check it.
+    """
+    k = _reserve(_candidates)
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=k)
+    futures = [pool.submit(_evaluate, scene, i, cancel) for i in range(k)]
+
+    fallback = None
+    try:
+        for future in as_completed(futures):
+            try:
+                index, code, valid, passed, feedback = future.result()
+            except Exception as e:
+                print(f"Candidate for {scene['scene_name']} failed: {e}")
+                continue
+
+            if passed:
+                cancel.set()
+                with _lock:
+                    _stats['scenes'] += 1
+                    _stats['wins_by_index'][index] = _stats['wins_by_index'].get(index, 0) + 1
+                    if index != 0:
+                        _stats['paid_off'] += 1
+                return code, True, feedback
+
+            # Prefer a candidate that at least validates as the fallback
+            if fallback is None or (valid and not fallback[0]):
+                fallback = (valid, code, passed, feedback)
+    finally:
+        cancel.set()
+        # Don't wait for stragglers: queued candidates are dropped, running ones see `cancel`
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    with _lock:
+        _stats['scenes'] += 1
+        _stats['no_winner'] += 1
+    if fallback is None:
+        raise RuntimeError(f"all {k} candidates failed for {scene['scene_name']}")
+    _, code, passed, feedback = fallback
+    return code, (None if passed is None else False), feedback
+
+def stats_summary():
+    """
+    Summarises how often speculation paid off.
+
+    Returns:
+        str: One-line summary, or "" if no scene was speculated on.
+    """
+    with _lock:
+        if not _stats['scenes']:
+            return ""
+        wins = ", ".join(f"#{i}: {n}" for i, n in sorted(_stats['wins_by_index'].items()))
+        return (f"{_stats['scenes']} scenes speculated, {_stats['extra_calls']} extra generations, "
+                f"paid off {_stats['paid_off']} times, no winner {_stats['no_winner']} times"
+                + (f" (wins by candidate {wins})" if wins else ""))
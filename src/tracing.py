@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Values summed when several are added to one span; anything else is overwritten
+COUNTERS = ("prompt_tokens", "completion_tokens", "cost", "llm_calls", "cache_hits", "retries", "cpu_time")
+
+_local = threading.local()
+_spans = []  # finished spans, as dicts
+_lock = threading.Lock()
+# Maps perf_counter readings to wall-clock (Unix epoch) seconds. Anchored once,
+# so spans keep perf_counter's precision and monotonicity, while timestamps of
+# concurrent runs and batch processes still line up on one time axis.
+_wall_offset = time.time() - time.perf_counter()
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _children_cpu():
+    """CPU seconds used by reaped child processes (manim CLI renders, ffmpeg)."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times a pipeline stage on the current thread.
+
+    Spans nest per thread. Token counts, retries and CPU time reported with
+    add() while the span is open are attributed to it. Subprocess CPU time is
+    measured from the children's rusage, so it is only exact when no other
+    thread runs a subprocess at the same time.
+
+    Args:
+        name (str): Stage name, e.g. "generate" or "render attempt".
+        **attrs: Extra attributes shown in the trace (scene, attempt...).
+    """
+    record = {
+        'name': name,
+        'attrs': dict(attrs),
+        'thread': threading.current_thread().name,
+        'tid': threading.get_ident(),
+        'depth': len(_stack()),
+        'error': None,
+    }
+    stack = _stack()
+    stack.append(record)
+    start = time.perf_counter()
+    children_cpu = _children_cpu()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stack.pop()
+        record['start'] = start + _wall_offset
+        record['duration'] = time.perf_counter() - start
+        subprocess_cpu = _children_cpu() - children_cpu
+        if subprocess_cpu > 0:
+            record['attrs']['cpu_time'] = record['attrs'].get('cpu_time', 0.0) + subprocess_cpu
+        with _lock:
+            _spans.append(record)
+
+def add(**values):
+    """
+    Attributes values to the innermost open span of this thread (no-op outside a span).
+
+    Counters (tokens, cost, retries, cpu_time...) are summed; other values,
+    such as model, are set.
+    """
+    stack = _stack()
+    if not stack:
+        return
+    attrs = stack[-1]['attrs']
+    for key, value in values.items():
+        if value is None:
+            continue
+        if key in COUNTERS:
+            attrs[key] = attrs.get(key, 0) + value
+        else:
+            attrs[key] = value
+
+def spans():
+    """Returns a copy of the finished spans."""
+    with _lock:
+        return list(_spans)
+
+def summary_rows():
+    """
+    Aggregates finished spans per stage, in order of first appearance.
+
+    Returns:
+        list: Dicts with name, count, wall, errors and the summed COUNTERS.
+    """
+    rows = {}
+    for record in spans():
+        row = rows.setdefault(record['name'], {'name': record['name'], 'count': 0, 'wall': 0.0, 'errors': 0,
+                                               **{counter: 0 for counter in COUNTERS}})
+        row['count'] += 1
+        row['wall'] += record['duration']
+        row['errors'] += record['error'] is not None
+        for counter in COUNTERS:
+            row[counter] += record['attrs'].get(counter, 0)
+    return list(rows.values())
+
+def print_summary(console):
+    """Prints the per-stage table for the run (nothing if no span was recorded)."""
+    rows = summary_rows()
+    if not rows:
+        return
+    from rich.table import Table
+
+    table = Table(title="Run trace", title_justify="left")
+    for column in ("Stage", "Count", "Wall (s)", "Mean (s)", "Subproc CPU (s)",
+                   "Prompt tok", "Completion tok", "LLM calls", "Cached", "Retries", "Cost ($)", "Errors"):
+        table.add_column(column, justify="left" if column == "Stage" else "right")
+    for row in rows:
+        table.add_row(
+            row['name'],
+            str(row['count']),
+            f"{row['wall']:.1f}",
+            f"{row['wall'] / row['count']:.2f}",
+            f"{row['cpu_time']:.1f}" if row['cpu_time'] else "",
+            str(row['prompt_tokens'] or ""),
+            str(row['completion_tokens'] or ""),
+            str(row['llm_calls'] or ""),
+            str(row['cache_hits'] or ""),
+            str(row['retries'] or ""),
+            f"{row['cost']:.4f}" if row['cost'] else "",
+            str(row['errors'] or ""),
+        )
+    console.print(table)
+
+def export_chrome_trace(path, process_name=None):
+    """
+    Writes the finished spans as a Chrome trace-event JSON file.
+
+    Each span becomes a complete ("X") event on its thread; open the file in
+    Perfetto (ui.perfetto.dev) or chrome://tracing. Events carry the real
+    pid, so traces of concurrent runs can be loaded side by side.
+
+    Args:
+        path (str): Output file.
+        process_name (str): Label for this run's process track.
+    """
+    pid = os.getpid()
+    records = spans()
+    tids = {}
+    events = [{
+        'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+        'args': {'name': process_name or f"manimator {pid}"},
+    }]
+    for record in records:
+        if record['tid'] not in tids:
+            tids[record['tid']] = len(tids) + 1
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tids[record['tid']],
+                'args': {'name': record['thread']},
+            })
+    for record in sorted(records, key=lambda r: (r['start'], r['depth'])):
+        args = dict(record['attrs'])
+        if record['error']:
+            args['error'] = record['error']
+        events.append({
+            'name': record['name'],
+            'cat': record['attrs'].get('scene', 'run'),
+            'ph': 'X',
+            'ts': round(record['start'] * 1e6),  # microseconds since the epoch
+            'dur': round(record['duration'] * 1e6),
+            'pid': pid,
+            'tid': tids[record['tid']],
+            'args': args,
+        })
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
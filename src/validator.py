@@ -0,0 +1,300 @@
+import ast
+import builtins
+import re
+import textwrap
+from functools import lru_cache
+
+# Mobjects that are not VMobjects (cannot live in a VGroup, cannot be drawn with Write/Create)
+IMAGE_CLASSES = {"ImageMobject"}
+# Vector-based, but still should not be Write/Create'd (see SYSTEM_PROMPT)
+SVG_CLASSES = {"SVGMobject"}
+DRAW_ANIMATIONS = {"Write", "Create"}
+
+# Pango markup has no LaTeX; a backslash command inside MarkupText will not render
+LATEX_COMMAND = re.compile(r"\\[A-Za-z]+")
+
+@lru_cache(maxsize=1)
+def manim_names():
+    """
+    Returns the names provided by `from manim import *`, or None if manim is
+    not importable in this process (name resolution is then skipped).
+    """
+    try:
+        import manim
+    except Exception:
+        return None
+    return frozenset(name for name in dir(manim) if not name.startswith("_"))
+
+def _issue(node, severity, message):
+    return {
+        'line': getattr(node, 'lineno', 0),
+        'severity': severity,
+        'message': message,
+    }
+
+def _bound_names(tree):
+    """Collects every name the construct body binds anywhere (assignment, loops, imports, defs...)."""
+    bound = {"self"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                bound.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+    return bound
+
+def _call_name(node):
+    """Returns 'Foo' for Foo(...) and 'self.foo' style dotted names for attribute calls."""
+    if not isinstance(node, ast.Call):
+        return None
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+        return f"{func.value.id}.{func.attr}"
+    return None
+
+def _names_assigned_from(tree, classes):
+    """Variables assigned directly from a constructor in classes (e.g. img = ImageMobject(...))."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and _call_name(node.value) in classes:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    names.add(target.id)
+    return names
+
+def _is_instance_of(node, classes, variables):
+    if _call_name(node) in classes:
+        return True
+    return isinstance(node, ast.Name) and node.id in variables
+
+def _string_value(node):
+    """Best-effort literal text of a str constant or f-string."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        return "".join(
+            part.value for part in node.values
+            if isinstance(part, ast.Constant) and isinstance(part.value, str)
+        )
+    return None
+
+def validate_code(code):
+    """
+    Statically validates the code inside construct(self) without running manim.
+
+    Args:
+        code (str): The construct body.
+
+    Returns:
+        list: Issue dicts, e.g. [{'line': 3, 'severity': 'error', 'message': '...'}].
+              Errors would make the render fail; warnings are style problems.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{
+            'line': e.lineno or 0,
+            'severity': 'error',
+            'message': f"{type(e).__name__}: {e.msg}",
+        }]
+
+    issues = []
+
+    # Resolve every loaded name against locals, builtins and the manim namespace
+    known = manim_names()
+    if known is not None:
+        defined = _bound_names(tree) | set(dir(builtins)) | known
+        reported = set()
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+                    and node.id not in defined and node.id not in reported):
+                reported.add(node.id)
+                issues.append(_issue(node, 'error', f"NameError: name '{node.id}' is not defined"))
+
+    images = _names_assigned_from(tree, IMAGE_CLASSES)
+    svgs = _names_assigned_from(tree, SVG_CLASSES)
+    vgroups = _names_assigned_from(tree, {"VGroup"})
+
+    for node in ast.walk(tree):
+        name = _call_name(node)
+        if name is None:
+            continue
+
+        # ImageMobject inside a VGroup (constructor or .add)
+        is_vgroup_add = (name.endswith(".add") and isinstance(node.func, ast.Attribute)
+                         and isinstance(node.func.value, ast.Name) and node.func.value.id in vgroups)
+        if name == "VGroup" or is_vgroup_add:
+            for arg in node.args:
+                if _is_instance_of(arg, IMAGE_CLASSES, images):
+                    issues.append(_issue(node, 'error',
+                        "TypeError: VGroup only accepts VMobjects; use Group() for ImageMobject"))
+                    break
+
+        # Write/Create on images and SVGs
+        elif name in DRAW_ANIMATIONS and node.args:
+            target = node.args[0]
+            if _is_instance_of(target, IMAGE_CLASSES, images):
+                issues.append(_issue(node, 'error',
+                    f"{name} cannot draw an ImageMobject; use FadeIn or GrowFromCenter"))
+            elif _is_instance_of(target, SVG_CLASSES, svgs):
+                issues.append(_issue(node, 'warning',
+                    f"{name} on an SVGMobject; prefer FadeIn or GrowFromCenter"))
+
+        # LaTeX commands in Pango markup
+        elif name == "MarkupText" and node.args:
+            text = _string_value(node.args[0])
+            match = LATEX_COMMAND.search(text or "")
+            if match:
+                issues.append(_issue(node, 'error',
+                    f"MarkupText only supports Pango markup, found LaTeX command '{match.group(0)}'"))
+
+        # self.wait() without a duration
+        elif name == "self.wait" and not node.args and not node.keywords:
+            issues.append(_issue(node, 'warning',
+                "self.wait() without a duration; pass explicit seconds, e.g. self.wait(2)"))
+
+    issues.sort(key=lambda issue: issue['line'])
+    return issues
+
+def format_issues(issues):
+    """Renders issues as an error report (used in place of a manim traceback)."""
+    return "\n".join(
+        f"line {issue['line']}: {issue['severity']}: {issue['message']}" for issue in issues
+    )
+
+def _parses(code):
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+def _scan_line(line, state):
+    """
+    Updates bracket depth / open string state for one physical line.
+
+    Returns:
+        str: The line with any trailing comment removed (for block-opener detection).
+    """
+    code_end = len(line)
+    i = 0
+    while i < len(line):
+        quote = state['quote']
+        if quote:
+            if line[i] == "\\":
+                i += 2
+                continue
+            if line.startswith(quote, i):
+                state['quote'] = None
+                i += len(quote)
+                continue
+            i += 1
+            continue
+
+        ch = line[i]
+        if ch == "#":
+            code_end = i
+            break
+        if ch in "\"'":
+            quote = line[i:i + 3] if line[i:i + 3] in ('"""', "'''") else ch
+            state['quote'] = quote
+            i += len(quote)
+            continue
+        if ch in "([{":
+            state['depth'] += 1
+        elif ch in ")]}":
+            state['depth'] = max(0, state['depth'] - 1)
+        i += 1
+
+    # Single-quoted strings cannot span lines
+    if state['quote'] in ("'", '"'):
+        state['quote'] = None
+    return line[:code_end].rstrip()
+
+def _reindent(code):
+    """
+    Rebuilds indentation from block structure instead of raw whitespace.
+
+    A line only starts a deeper block when the previous logical line opened
+    one (ends with ':'); stray extra indentation elsewhere is absorbed, and
+    a shallower line closes every block it is outside of. Continuation lines
+    (inside brackets or after a backslash) are kept inside the statement
+    they belong to; lines inside an open triple-quoted string are part of
+    its value and are kept verbatim. Runs in one pass over the lines.
+    """
+    out = []
+    stack = [0]  # original indentation of each open block
+    state = {'depth': 0, 'quote': None}
+    continued = False
+    opens_block = False
+
+    for line in code.splitlines():
+        stripped = line.strip()
+        if state['quote']:
+            # Inside a triple-quoted string: whitespace is part of the value
+            out.append(line)
+        elif not stripped:
+            out.append("")
+            continue
+        elif continued or state['depth'] > 0:
+            # Continuation of the previous statement: any indentation is legal
+            out.append("    " * len(stack) + stripped)
+        else:
+            indent = len(line) - len(line.lstrip())
+            if opens_block:
+                # The first line of a block defines its indentation, even if the LLM flattened it
+                stack.append(max(indent, stack[-1] + 1))
+            else:
+                while len(stack) > 1 and indent < stack[-1]:
+                    stack.pop()
+            out.append("    " * (len(stack) - 1) + stripped)
+
+        code_part = _scan_line(stripped, state)
+        continued = code_part.endswith("\\")
+        if state['depth'] == 0 and not state['quote'] and not continued:
+            opens_block = code_part.endswith(":")
+
+    return "\n".join(out)
+
+def normalize_code(code):
+    """
+    Normalizes LLM output into a parseable construct body.
+
+    The code is returned untouched (after dedent) if it already parses;
+    otherwise its indentation is rebuilt from block structure. If nothing
+    parses, the dedented code is returned so validate_code can report the
+    SyntaxError.
+
+    Args:
+        code (str): The raw construct body.
+
+    Returns:
+        str: The normalized code.
+    """
+    dedented = textwrap.dedent(code).strip("\n")
+    if _parses(dedented):
+        return dedented
+
+    reindented = _reindent(dedented)
+    if _parses(reindented):
+        return reindented
+
+    return dedented
+
+if __name__ == "__main__":
+    # Simple test: python validator.py file_with_construct_body.py
+    import sys
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            source = normalize_code(f.read())
+        print(format_issues(validate_code(source)) or "OK")
@@ -0,0 +1,132 @@
+import os
+import time
+from rich.console import Console
+
+from cache import cache_key
+from parser import iter_scenes
+from pipeline import run_pipeline, merge_videos
+import tracing
+
+console = Console()
+
+# Seconds between checks of the input file
+POLL_INTERVAL = 1.0
+# The file must stay unchanged this long before a rebuild starts (editors save in several writes)
+SETTLE_TIME = 0.3
+
+def scene_fingerprint(scene):
+    """
+    Identity of a scene's content.
+
+    Covers the narrative and the visual instruction but not the name: the
+    name only labels the output file, so a renamed (or moved) scene reuses
+    its video.
+    """
+    return cache_key(scene['narrative'], scene['visual_instruction'])
+
+class SceneIndex:
+    """
+    Fingerprint -> rendered video for every scene built so far.
+
+    Failed scenes are not indexed, so they are retried on the next change.
+    """
+
+    def __init__(self):
+        self.videos = {}
+
+    def dirty(self, scenes):
+        """Indices of scenes that need generating, one per distinct fingerprint."""
+        seen = set()
+        dirty = []
+        for index, scene in enumerate(scenes):
+            fingerprint = scene_fingerprint(scene)
+            if fingerprint in self.videos or fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            dirty.append(index)
+        return dirty
+
+    def record(self, scene, video_path):
+        if video_path:
+            self.videos[scene_fingerprint(scene)] = video_path
+
+    def prune(self, scenes):
+        """Forgets scenes no longer in the document."""
+        live = {scene_fingerprint(scene) for scene in scenes}
+        self.videos = {fp: path for fp, path in self.videos.items() if fp in live}
+
+    def videos_for(self, scenes):
+        """Video paths in document order (scenes without a video are skipped)."""
+        paths = [self.videos.get(scene_fingerprint(scene)) for scene in scenes]
+        return [path for path in paths if path]
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _build(input_file, index, jobs):
+    """Regenerates the dirty scenes of input_file and re-merges. Returns the merged path."""
+    with tracing.span("parse"):
+        scenes = list(iter_scenes(input_file))
+    dirty = index.dirty(scenes)
+    reused = len(scenes) - len(dirty)
+    console.print(f"[bold green]{len(scenes)} scenes: {len(dirty)} changed, {reused} reused.[/bold green]")
+    for i in dirty:
+        console.print(f"[dim]  changed: {scenes[i]['scene_name']}[/dim]")
+
+    if dirty:
+        dirty_scenes = [scenes[i] for i in dirty]
+        run_pipeline(dirty_scenes, jobs=jobs,
+                     on_scene_done=lambda i, path: index.record(dirty_scenes[i], path))
+    index.prune(scenes)
+
+    video_files = index.videos_for(scenes)
+    missing = len(scenes) - len(video_files)
+    if missing:
+        console.print(f"[bold yellow]{missing} scenes have no video and are left out of the merge.[/bold yellow]")
+    if not video_files:
+        console.print("[bold yellow]No videos were generated to merge.[/bold yellow]")
+        return None
+
+    output_merged = merge_videos(video_files)
+    if output_merged:
+        console.print(f"[bold green]Final video saved to: {output_merged}[/bold green]")
+    else:
+        console.print("[bold red]Error merging videos![/bold red]")
+    return output_merged
+
+def watch(input_file, jobs=1, interval=POLL_INTERVAL):
+    """
+    Builds input_file, then rebuilds only the changed scenes whenever it is saved.
+
+    Runs until interrupted (Ctrl-C).
+
+    Args:
+        input_file (str): Path to the markdown script.
+        jobs (int): Number of scenes to process concurrently.
+        interval (float): Seconds between checks of the file's mtime.
+    """
+    index = SceneIndex()
+    last = _stat(input_file)
+    _build(input_file, index, jobs)
+
+    console.print(f"[bold cyan]Watching {input_file} for changes (Ctrl-C to stop)...[/bold cyan]")
+    try:
+        while True:
+            time.sleep(interval)
+            current = _stat(input_file)
+            if current is None or current == last:
+                continue
+            # Wait for the save to settle
+            time.sleep(SETTLE_TIME)
+            if _stat(input_file) != current:
+                continue
+            last = current
+            console.print(f"\n[bold cyan]{input_file} changed, rebuilding...[/bold cyan]")
+            _build(input_file, index, jobs)
+            console.print(f"[bold cyan]Watching {input_file} for changes (Ctrl-C to stop)...[/bold cyan]")
+    except KeyboardInterrupt:
+        console.print("\n[dim]Stopped watching.[/dim]")
@@ -0,0 +1,32 @@
+import pytest
+
+import cache
+import llm
+import repairer
+import tracing
+from fake_openrouter import FakeOpenRouter
+
+BROKEN = "title = Txt('Hello')\nself.play(Write(title))\nself.wait(1)"
+ERROR = "NameError: name 'Txt' is not defined"
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = FakeOpenRouter(recordings={})
+    monkeypatch.setattr(llm, "BASE_URL", server.start())
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "fake")
+    monkeypatch.setattr(cache, "_enabled", False)
+    yield server
+    server.stop()
+    llm._client = None
+
+@pytest.mark.parametrize("fmt", ["edit", "diff"])
+def test_streamed_patch_repair_applies_in_one_request(fake_server, fmt):
+    with tracing.span("repair") as record:
+        fixed = repairer.repair_code(BROKEN, ERROR, stream=True, fmt=fmt)
+
+    # The fake server's patch tags the first line
+    assert fixed.splitlines()[0] == "title = Txt('Hello')  # repaired"
+    assert fixed.splitlines()[1:] == BROKEN.splitlines()[1:]
+    assert fake_server.stats['requests'] == 1
+    assert record['attrs']['repair_format'] == fmt
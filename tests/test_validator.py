@@ -0,0 +1,17 @@
+from validator import normalize_code
+
+def test_reindent_keeps_triple_quoted_strings_verbatim():
+    # The over-indented wait forces a rebuild of the indentation
+    code = 'x = """a\n  b\n"""\n        self.wait(1)'
+
+    fixed = normalize_code(code)
+
+    namespace = {}
+    exec(fixed.replace("self.wait(1)", "pass"), namespace)
+    assert namespace['x'] == "a\n  b\n"
+    assert fixed.splitlines()[-1] == "self.wait(1)"
+
+def test_reindent_rebuilds_blocks_after_a_string():
+    code = 'x = """a\n    b:\n"""\nif x:\nself.wait(1)'
+
+    assert normalize_code(code) == 'x = """a\n    b:\n"""\nif x:\n    self.wait(1)'